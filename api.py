@@ -1,17 +1,25 @@
 # api.py
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Optional
 import os
-from functions import run_migration_logic
+from jobs import MigrationJobs
+from metrics import format_prometheus, format_query_cache, load_history
+from query_engine import STREAM_BATCH_ROWS, QueryEngine, QueryError
 from dotenv import load_dotenv
-from pydantic import BaseModel
-import subprocess
+from pydantic import BaseModel, Field
+import sqlite3
 import json
 
 # Load environment variables
 load_dotenv(override=True)
 
 data_source = os.getenv('PATH_DATABASES', 'Z:/SoporteTi/sisclin//DATA')
+# Las tablas consultadas quedan registradas en memoria entre solicitudes
+query_engine = QueryEngine(data_source)
+# Las migraciones corren en segundo plano para no bloquear el servidor
+migration_jobs = MigrationJobs()
 app = FastAPI()
 
 # Configuración de CORS
@@ -33,6 +41,23 @@ app.add_middleware(
 
 class QueryModel(BaseModel):
     query: str
+    # Paginación: se aplica dentro de la consulta, no sobre el resultado
+    limit: Optional[int] = Field(None, ge=0)
+    offset: int = Field(0, ge=0)
+    # Devuelve el resultado como NDJSON (un objeto JSON por línea) a medida que se lee
+    stream: bool = False
+
+
+def ndjson_lines(columns, rows):
+    # Las filas se envían por bloques para no hacer una escritura por fila
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+        if len(lines) == STREAM_BATCH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
 
 
 @app.get("/")
@@ -52,17 +77,44 @@ async def run_migration():
             "SC0017", "SC0002", "SC0012"
         ]
 
-        # Ejecuta la lógica
-        messages = run_migration_logic(path_databases, output_folder, tables)
+        # Encola la migración; si ya hay una igual en curso se devuelve esa
+        job_id, created = migration_jobs.submit(path_databases, output_folder, tables)
 
         return {
-            "status": "success",
-            "messages": messages
+            "status": "accepted" if created else "running",
+            "job_id": job_id
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/jobs")
+async def list_jobs():
+    return migration_jobs.list()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    # Estado por tabla, filas procesadas y tiempo restante estimado
+    job = migration_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return job
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Métricas de la última corrida y de la caché de consultas en formato Prometheus
+    content = format_prometheus(load_history()) + format_query_cache(query_engine.cache.stats())
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/history")
+def get_metrics_history(limit: int = 10):
+    # Corridas recientes, de la más nueva a la más antigua
+    return list(reversed(load_history()[-limit:])) if limit > 0 else []
+
+
 @app.post("/execute_query")
 def execute_query(data: QueryModel):
     try:
@@ -71,27 +123,20 @@ def execute_query(data: QueryModel):
             raise HTTPException(
                 status_code=400, detail="Solo se permiten consultas del tipo SELECT.")
 
-        # Define el path del ejecutable dbf_query.exe
-        # Asegúrate de poner la ruta correcta
-        executable_path = "dbf_query.exe"
-        query = data.query  # Toma la consulta del request
-
-        # Usa subprocess para ejecutar el .exe y pasar la consulta como parámetro
-        result = subprocess.run(
-            [executable_path, data_source, query], capture_output=True, text=True)
-
-        # Verifica si hubo error en la ejecución
-        if result.returncode != 0:
-            raise HTTPException(
-                status_code=500, detail=f"Error en dbf_query.exe: {result.stderr}")
-
-        # Devuelve el resultado procesado
+        # Ejecuta la consulta en el motor SQL del proceso, sin lanzar dbf_query.exe
         try:
-            output_json = json.loads(result.stdout)  # Si la salida es JSON
-            return output_json
-        except json.JSONDecodeError:
+            if data.stream:
+                columns, rows = query_engine.stream(data.query, data.limit, data.offset)
+                return StreamingResponse(ndjson_lines(columns, rows),
+                                         media_type="application/x-ndjson")
+            return query_engine.query(data.query, data.limit, data.offset)
+        except (sqlite3.Error, QueryError) as e:
             raise HTTPException(
-                status_code=500, detail="Error al procesar los resultados JSON.")
+                status_code=400, detail=f"Error en la consulta: {str(e)}")
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error en execute_query: {str(e)}")
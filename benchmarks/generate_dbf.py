@@ -0,0 +1,225 @@
+"""
+Genera tablas DBF/FPT de Visual FoxPro sintéticas a partir de los esquemas de
+fields.py, con memos y registros eliminados, para medir el pipeline sin la
+carpeta DATA de producción.
+
+    python benchmarks/generate_dbf.py SC0011 100000 bench_data
+"""
+import argparse
+import os
+import struct
+import sys
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fields import COLUMN_RULES, PREDEFINED_FIELDS  # noqa: E402
+
+
+# Registros que se generan y escriben por bloque
+CHUNK_RECORDS = 200000
+
+MEMO_BLOCK_SIZE = 64
+MEMO_BLOCKS = 4  # bloques por memo (256 bytes)
+FPT_HEADER_SIZE = 512
+
+# Memo adicional que no está en el esquema, como los de las tablas reales
+EXTRA_MEMO_FIELD = 'OBS_MEMO'
+
+MEMO_TEXTS = [
+    'Paciente refiere dolor leve. Control en 7 días.',
+    'Se entrega resultado al paciente; sin observaciones.',
+    'Atención anulada por duplicidad del documento. Revisar la caja del día '
+    'y coordinar con facturación la emisión de la nota de crédito.',
+]
+
+FIRST_DATE = np.datetime64('2020-01-01')
+
+# Valores numéricos distintos por columna N
+NUMBER_VALUES = 100000
+
+
+def _char_width(field, primary_key):
+    if field == primary_key or field.startswith('ID_') or field == 'NUM_DOC':
+        return 10
+    if 'zfill' in COLUMN_RULES.get(field, {}):
+        return COLUMN_RULES[field]['zfill']
+    if field in COLUMN_RULES:
+        return 8
+    if field.startswith('NOM_'):
+        return 40
+    return 20
+
+
+def build_layout(table_name):
+    """Campos DBF (nombre, tipo, largo, decimales) equivalentes al esquema."""
+    table = PREDEFINED_FIELDS[table_name]
+    primary_key = table.get('primary_key')
+    layout = []
+    for field, field_type in table['fields'].items():
+        base_type = field_type.split('(')[0]
+        if base_type == 'DATE':
+            layout.append((field, 'D', 8, 0))
+        elif base_type == 'BOOLEAN':
+            layout.append((field, 'L', 1, 0))
+        elif base_type == 'DECIMAL':
+            layout.append((field, 'N', 10, 2))
+        elif base_type == 'INT':
+            layout.append((field, 'N', 10, 0))
+        elif base_type == 'TEXT':
+            layout.append((field, 'M', 4, 0))
+        else:
+            layout.append((field, 'C', _char_width(field, primary_key), 0))
+    layout.append((EXTRA_MEMO_FIELD, 'M', 4, 0))
+    return layout
+
+
+def _fixed_width(values, width):
+    """Valores como bytes de ancho fijo, completados con espacios."""
+    data = np.asarray(values).astype(f'S{width}').view(np.uint8).reshape(-1, width).copy()
+    data[data == 0] = ord(' ')
+    return data
+
+
+_vocabularies = {}
+
+
+def _vocabulary(kind, width, size):
+    """Valores de ejemplo ya formateados; las columnas se arman indexándolos."""
+    key = (kind, width, size)
+    if key not in _vocabularies:
+        if kind == 'date':
+            days = (np.datetime64(date.today()) - FIRST_DATE).astype(int)
+            values = np.char.replace(
+                np.datetime_as_string(FIRST_DATE + np.arange(days), unit='D'), '-', '')
+        elif kind == 'number':
+            # `size` son los decimales de la columna
+            values = np.char.mod(f'%{width}.{size}f',
+                                 np.random.default_rng(width).random(NUMBER_VALUES) * 10000)
+        elif kind == 'code':
+            values = np.arange(1, size + 1).astype(str)
+            # Algunos códigos inválidos, como en los datos reales
+            values[::100] = 'S/N'
+        else:
+            values = np.char.add(kind, np.arange(size).astype(str))
+        _vocabularies[key] = _fixed_width(values, width)
+    return _vocabularies[key]
+
+
+def _pick(vocabulary, count, rng, blank_ratio=0.0):
+    values = vocabulary[rng.integers(0, len(vocabulary), count)]
+    if blank_ratio:
+        values[rng.random(count) < blank_ratio] = ord(' ')
+    return values
+
+
+def _char_values(field, width, primary_key, positions, rng):
+    count = len(positions)
+    if field == primary_key or field.startswith('ID_') or (field == 'NUM_DOC' and not primary_key):
+        return _fixed_width(positions + 1, width)
+    if field in COLUMN_RULES:
+        return _pick(_vocabulary('code', width, min(10 ** width - 1, 100000)), count, rng)
+    if field.startswith('NOM_'):
+        return _pick(_vocabulary('NOMBRE ', width, 5000), count, rng)
+    return _pick(_vocabulary('V', width, 200), count, rng)
+
+
+def _memo_templates():
+    templates = []
+    for text in MEMO_TEXTS:
+        data = text.encode('latin-1')
+        block = struct.pack('>II', 1, len(data)) + data
+        templates.append(block.ljust(MEMO_BLOCK_SIZE * MEMO_BLOCKS, b'\0'))
+    return np.frombuffer(b''.join(templates), dtype=np.uint8).reshape(len(templates), -1)
+
+
+def generate_table(table_name, dbf_path, record_count, deleted_ratio=0.05, memo_ratio=0.3,
+                   seed=1):
+    """
+    Escribe `record_count` registros sintéticos de la tabla en `dbf_path` y
+    sus memos en el .FPT. Devuelve la cantidad de registros eliminados.
+    """
+    rng = np.random.default_rng(seed)
+    primary_key = PREDEFINED_FIELDS[table_name].get('primary_key')
+    layout = build_layout(table_name)
+    header_length = 32 + 32 * len(layout) + 1 + 263
+    record_length = 1 + sum(length for _, _, length, _ in layout)
+    memo_fields = [field for field, field_type, _, _ in layout if field_type == 'M']
+    templates = _memo_templates()
+    deleted = 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(dbf_path)), exist_ok=True)
+    fpt_path = os.path.splitext(dbf_path)[0] + '.FPT'
+    today = date.today()
+
+    with open(dbf_path, 'wb') as dbf, open(fpt_path, 'wb') as fpt:
+        dbf.write(struct.pack('<BBBBIHH', 0x30, today.year % 100, today.month, today.day,
+                              record_count, header_length, record_length))
+        dbf.write(b'\0' * 16 + bytes([0x02 if memo_fields else 0]) + b'\0' * 3)
+        offset = 1
+        for field, field_type, length, decimals in layout:
+            dbf.write(field.encode('ascii').ljust(11, b'\0') + field_type.encode('ascii')
+                      + struct.pack('<I', offset) + bytes([length, decimals]) + b'\0' * 14)
+            offset += length
+        dbf.write(b'\r' + b'\0' * 263)
+
+        fpt.write(b'\0' * FPT_HEADER_SIZE)
+        next_block = FPT_HEADER_SIZE // MEMO_BLOCK_SIZE
+
+        for start in range(0, record_count, CHUNK_RECORDS):
+            positions = np.arange(start, min(start + CHUNK_RECORDS, record_count))
+            count = len(positions)
+            columns = []
+
+            flags = np.full((count, 1), ord(' '), dtype=np.uint8)
+            is_deleted = rng.random(count) < deleted_ratio
+            flags[is_deleted] = ord('*')
+            deleted += int(is_deleted.sum())
+            columns.append(flags)
+
+            for field, field_type, length, decimals in layout:
+                if field_type == 'C':
+                    columns.append(_char_values(field, length, primary_key, positions, rng))
+                elif field_type == 'D':
+                    columns.append(_pick(_vocabulary('date', 8, 0), count, rng, 0.02))
+                elif field_type == 'N':
+                    columns.append(_pick(_vocabulary('number', length, decimals), count, rng, 0.01))
+                elif field_type == 'L':
+                    choices = np.frombuffer(b'TF ', dtype=np.uint8)
+                    columns.append(choices[rng.integers(0, 3, count)].reshape(-1, 1))
+                elif field_type == 'M':
+                    has_memo = rng.random(count) < memo_ratio
+                    memo_count = int(has_memo.sum())
+                    blocks = np.zeros(count, dtype='<u4')
+                    blocks[has_memo] = next_block + MEMO_BLOCKS * np.arange(memo_count)
+                    next_block += MEMO_BLOCKS * memo_count
+                    fpt.write(templates[rng.integers(0, len(templates), memo_count)].tobytes())
+                    columns.append(blocks.view(np.uint8).reshape(-1, 4))
+
+            dbf.write(np.hstack(columns).tobytes())
+
+        dbf.write(b'\x1a')
+        fpt.seek(0)
+        fpt.write(struct.pack('>IxxH', next_block, MEMO_BLOCK_SIZE))
+
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('table', choices=sorted(PREDEFINED_FIELDS))
+    parser.add_argument('rows', type=int)
+    parser.add_argument('folder')
+    parser.add_argument('--deleted', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    dbf_path = os.path.join(args.folder, f"{args.table}.DBF")
+    deleted = generate_table(args.table, dbf_path, args.rows, args.deleted, seed=args.seed)
+    print(f"{dbf_path}: {args.rows} registros ({deleted} eliminados)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Mide el pipeline DBF -> MySQL por etapas sobre tablas sintéticas y escribe
+los resultados en JSON para comparar una versión con otra.
+
+    python benchmarks/run_benchmarks.py --tables SC0011,SC0017 --rows 10000,1000000
+
+Etapas: generate (no forma parte del pipeline), decode (DBFReader), transform
+(transform_dataframe), write (CSV intermedio) y load. La carga usa SQLite en
+memoria salvo que se indique --mysql, que carga en la base --mysql-database.
+Cada caso corre en un proceso nuevo para que el pico de memoria sea propio.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fields import PREDEFINED_FIELDS, get_date_filters, get_table_columns  # noqa: E402
+from generate_dbf import generate_table  # noqa: E402
+from metrics import peak_rss_bytes  # noqa: E402
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual, en MB."""
+    return peak_rss_bytes() / 2 ** 20
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args):
+        """Ejecuta `function`, que devuelve (resultado, filas), y registra la etapa."""
+        start = time.perf_counter()
+        result, rows = function(*args)
+        seconds = time.perf_counter() - start
+        self.stages[name] = {
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        return result
+
+
+def load_sqlite(csv_path, table_name):
+    """Carga el CSV en SQLite en memoria con el mismo recorrido de filas que MySQL."""
+    from import_csv_mysql import insert_rows, iter_csv_rows
+
+    predefined_fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    with open(csv_path, 'r', encoding='latin-1') as csvfile:
+        reader = csv.reader(csvfile)
+        headers = [header.upper() for header in next(reader)]
+        cursor.execute(f"CREATE TABLE {table_name} ({', '.join(headers)})")
+        insert_query = (f"INSERT INTO {table_name} ({', '.join(headers)}) "
+                        f"VALUES ({', '.join(['?'] * len(headers))})")
+        rows = insert_rows(cursor, insert_query, iter_csv_rows(reader, headers, predefined_fields))
+    conn.commit()
+    conn.close()
+    return rows
+
+
+def load_mysql(csv_path, table_name, database):
+    from import_csv_mysql import migrate_to_mysql
+    from mysql_pool import get_mysql_config
+
+    mysql_config = get_mysql_config()
+    mysql_config['database'] = database
+    migrate_to_mysql(csv_path, table_name, mysql_config)
+
+
+def run_case(table_name, rows, folder, mysql_database=None):
+    """Genera la tabla y mide cada etapa. Devuelve el resultado del caso."""
+    from dbf_reader import DBFReader
+    from process_csv import transform_dataframe
+
+    timer = StageTimer()
+    dbf_path = os.path.join(folder, f"{table_name}.DBF")
+    csv_path = os.path.join(folder, f"{table_name}.csv")
+
+    def generate():
+        return generate_table(table_name, dbf_path, rows), rows
+
+    def decode():
+        reader = DBFReader(dbf_path, skip_deleted=True)
+        df = reader.to_dataframe(get_table_columns(table_name), get_date_filters(table_name))
+        return df, len(df)
+
+    def transform(df):
+        df = transform_dataframe(df, table_name)
+        return df, len(df)
+
+    def write(df):
+        df.to_csv(csv_path, index=False, encoding='latin-1')
+        return None, len(df)
+
+    def load(count):
+        if mysql_database:
+            load_mysql(csv_path, table_name, mysql_database)
+            return None, count
+        return None, load_sqlite(csv_path, table_name)
+
+    deleted = timer.run('generate', generate)
+    df = timer.run('decode', decode)
+    df = timer.run('transform', transform, df)
+    count = len(df)
+    timer.run('write', write, df)
+    del df
+    timer.run('load', load, count)
+
+    return {
+        'table': table_name,
+        'rows': rows,
+        'deleted': deleted,
+        'rows_loaded': count,
+        'dbf_mb': round(os.path.getsize(dbf_path) / 2 ** 20, 1),
+        'load_target': 'mysql' if mysql_database else 'sqlite',
+        'stages': timer.stages,
+    }
+
+
+def _run_case_in_folder(table_name, rows, mysql_database):
+    with tempfile.TemporaryDirectory(prefix='sisclin_bench_') as folder:
+        return run_case(table_name, rows, folder, mysql_database)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tables', default=','.join(PREDEFINED_FIELDS),
+                        help='tablas separadas por coma (por defecto todas las de fields.py)')
+    parser.add_argument('--rows', default='10000',
+                        help='cantidades de registros separadas por coma, p. ej. 10000,1000000,10000000')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--mysql', action='store_true', help='cargar en MySQL en lugar de SQLite')
+    parser.add_argument('--mysql-database', default='sisclin_bench')
+    args = parser.parse_args()
+
+    tables = [table.strip().upper() for table in args.tables.split(',') if table.strip()]
+    sizes = [int(size) for size in args.rows.split(',')]
+    mysql_database = args.mysql_database if args.mysql else None
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for rows in sizes:
+        for table_name in tables:
+            with context.Pool(1) as pool:
+                result = pool.apply(_run_case_in_folder, (table_name, rows, mysql_database))
+            stages = ', '.join(f"{name} {stage['seconds']:.2f}s"
+                               for name, stage in result['stages'].items())
+            print(f"{table_name} {rows}: {stages}, pico {result['stages']['load']['peak_rss_mb']} MB")
+            results.append(result)
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados en {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from sync_state import SYNC_STATE_FOLDER
+
+
+def get_snapshot_path(output_folder, table_name):
+    return os.path.join(output_folder, SYNC_STATE_FOLDER, f"{table_name}.snapshot.npz")
+
+
+def load_snapshot(output_folder, table_name):
+    """Devuelve (llaves, hashes) de la última carga, o None si no hay snapshot."""
+    try:
+        with np.load(get_snapshot_path(output_folder, table_name)) as snapshot:
+            # Las llaves se comparan como objetos: el índice de pandas es más rápido
+            return snapshot['keys'].astype(object), snapshot['hashes']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_snapshot(output_folder, table_name, keys, hashes):
+    snapshot_path = get_snapshot_path(output_folder, table_name)
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    # np.savez agrega .npz al nombre si no lo tiene
+    temp_path = snapshot_path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(temp_path, keys=keys.astype(str), hashes=hashes)
+    os.replace(temp_path, snapshot_path)
+
+
+def clear_snapshot(output_folder, table_name):
+    try:
+        os.remove(get_snapshot_path(output_folder, table_name))
+    except FileNotFoundError:
+        pass
+
+
+def build_snapshot(df, primary_key):
+    """
+    Calcula la llave primaria y el hash de cada fila en bloque. Con llaves
+    repetidas se conserva la última fila, igual que en un upsert.
+    """
+    df = df.drop_duplicates(subset=[primary_key], keep='last')
+    keys = df[primary_key].astype(str).to_numpy(dtype=object)
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return df, keys, hashes
+
+
+def diff_snapshot(df, keys, hashes, snapshot):
+    """
+    Compara las filas actuales con el snapshot anterior. Devuelve las filas a
+    insertar o actualizar y las llaves eliminadas.
+    """
+    old_keys, old_hashes = snapshot
+    positions = pd.Index(old_keys).get_indexer(keys)
+    existing = positions >= 0
+
+    changed = ~existing
+    changed[existing] = old_hashes[positions[existing]] != hashes[existing]
+
+    deleted = pd.Index(keys).get_indexer(old_keys) < 0
+
+    return df[changed], old_keys[deleted].tolist(), {
+        'inserted': int((~existing).sum()),
+        'updated': int(changed[existing].sum()),
+        'deleted': int(deleted.sum()),
+    }
@@ -1,13 +1,102 @@
-import subprocess
 import os
-from process_csv import process_csv
+import metrics
+from dbf_reader import DBFReader
+from fields import get_date_filters, get_table_columns
+from process_csv import transform_dataframe
 
 
-def convert_dbf_to_csv(dbf_path, csv_path):
+def get_table_name(dbf_path):
+    """Nombre de la tabla a partir del nombre del archivo DBF."""
+    return os.path.splitext(os.path.basename(dbf_path))[0].upper()
+
+
+def record_decode(reader, records, df):
+    """Registra los bytes leídos y las filas que la decodificación descartó."""
+    metrics.add_bytes_read(records * reader.record_length)
+    metrics.add_rows('decode', records, len(df))
+    # Registros eliminados y fuera de cada rango de fechas, filtrados sobre los bytes crudos
+    for filter_name, rows in df.attrs.get('dropped', {}).items():
+        metrics.add_dropped(filter_name, rows)
+
+
+def read_dbf_table(dbf_path, start_date=None, start=0, reader=None, workers=None, stop=None,
+                   positions=None):
+    """
+    Decodifica el DBF por columnas (omitiendo registros eliminados, como /SKIPD)
+    y devuelve el DataFrame ya transformado. Solo se leen los campos definidos
+    en el esquema de la tabla y los registros dentro de su rango de fechas;
+    `start` y `stop` permiten leer solo los registros de ese rango y
+    `positions`, solo los registros de esas posiciones.
+    `workers` (por defecto DECODE_WORKERS, o 1) reparte la decodificación de
+    la tabla entre varios procesos.
+    """
+    table_name = get_table_name(dbf_path)
+    if reader is None:
+        reader = DBFReader(dbf_path, skip_deleted=True)
+    if workers is None:
+        workers = int(os.getenv('DECODE_WORKERS', '1'))
+    if positions is not None:
+        with metrics.stage('decode'):
+            df = reader.to_dataframe(get_table_columns(table_name),
+                                     get_date_filters(table_name, start_date),
+                                     positions=positions)
+        record_decode(reader, len(positions), df)
+        return transform_dataframe(df, table_name, start_date)
+
+    with metrics.stage('decode'):
+        df = reader.to_dataframe_parallel(
+            columns=get_table_columns(table_name),
+            date_filters=get_date_filters(table_name, start_date),
+            workers=workers,
+            start=start,
+            stop=stop)
+    stop = reader.record_count if stop is None else min(stop, reader.record_count)
+    record_decode(reader, max(0, stop - start), df)
+    return transform_dataframe(df, table_name, start_date)
+
+
+def iter_dbf_table(dbf_path, start_date=None, batch_size=50000, reader=None):
+    """
+    Igual que read_dbf_table, pero genera el resultado transformado por lotes
+    de `batch_size` registros, de modo que la memoria depende del lote y no
+    del tamaño de la tabla. Siempre genera al menos un lote (aunque esté vacío).
+    """
+    table_name = get_table_name(dbf_path)
+    if reader is None:
+        reader = DBFReader(dbf_path, skip_deleted=True)
+    columns = get_table_columns(table_name)
+    date_filters = get_date_filters(table_name, start_date)
+
+    empty = True
+    for chunk_start, chunk_stop in reader.record_ranges(batch_size):
+        empty = False
+        with metrics.stage('decode'):
+            df = reader.to_dataframe(columns, date_filters, chunk_start, chunk_stop)
+        record_decode(reader, chunk_stop - chunk_start, df)
+        yield transform_dataframe(df, table_name, start_date)
+    if empty:
+        df = reader.to_dataframe(columns, date_filters, start=0, stop=0)
+        yield transform_dataframe(df, table_name, start_date)
+
+
+def convert_dbf_to_csv(dbf_path, csv_path, start_date=None, chunk_size=None):
+    """
+    Decodifica, transforma y escribe el CSV final de la tabla. Con
+    `chunk_size` (por defecto CSV_CHUNK_SIZE, o toda la tabla de una vez) se
+    procesa por lotes de registros del DBF que se agregan al CSV, de modo que
+    la memoria depende del lote y no del tamaño de la tabla. El CSV anterior
+    se elimina antes de convertir y los errores se lanzan, para que la tabla
+    no se cargue con los datos de la corrida pasada.
+    """
+    if chunk_size is None:
+        chunk_size = int(os.getenv('CSV_CHUNK_SIZE', '0')) or None
+
     try:
         # Convertir rutas a formato consistente
         dbf_path = os.path.abspath(dbf_path)
         csv_path = os.path.abspath(csv_path)
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
 
         # Validar existencia del archivo DBF
         if not os.path.exists(dbf_path):
@@ -16,36 +105,57 @@ def convert_dbf_to_csv(dbf_path, csv_path):
         # Crear la carpeta de destino si no existe
         os.makedirs(os.path.dirname(csv_path), exist_ok=True)
 
-        # Ruta al ejecutable de DBF Viewer 2000
-        dbf_viewer_path = r"C:\Program Files (x86)\DBF Viewer 2000\dbview.exe"
-
-        # Construir el comando para convertir el archivo DBF a CSV
-        command = [
-            dbf_viewer_path,
-            dbf_path,
-            f"/export:{csv_path}",
-            "/SKIPD",  # Omitir registros eliminados
-            "/SEP,",   # Usar coma como separador
-            # "/UTF8",   # Codificación UTF-8
-            "/HDR"     # Incluir encabezados en el CSV
-        ]
-
-        # Ejecutar el comando
-        subprocess.run(
-            command, creationflags=subprocess.CREATE_NO_WINDOW, check=True)
-
-        # Verificar si el archivo CSV fue generado
-        if not os.path.exists(csv_path):
-            raise FileNotFoundError(
-                f"El archivo CSV no fue generado: {csv_path}")
-
-        # Procesar el archivo CSV resultante
-        table_name = os.path.splitext(os.path.basename(dbf_path))[0].upper()
-        process_csv(csv_path, table_name)
-
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Error al ejecutar DBF Viewer 2000: {e}")
-    except FileNotFoundError as e:
-        print(f"Archivo no encontrado: {e}")
+        # Decodificar, transformar y escribir el CSV final
+        if not chunk_size:
+            df = read_dbf_table(dbf_path, start_date)
+            with metrics.stage('write'):
+                df.to_csv(csv_path, index=False, encoding='latin-1')
+            metrics.add_rows('write', len(df), len(df))
+            return
+
+        # Escribir en un temporal y reemplazar el CSV al terminar
+        temp_path = csv_path + '.tmp'
+        try:
+            header = True
+            for df in iter_dbf_table(dbf_path, start_date, batch_size=chunk_size):
+                with metrics.stage('write'):
+                    df.to_csv(temp_path, index=False, encoding='latin-1',
+                              mode='w' if header else 'a', header=header)
+                metrics.add_rows('write', len(df), len(df))
+                header = False
+            os.replace(temp_path, csv_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error en la conversión del archivo DBF: {e}")
+
+
+def convert_dbf_to_parquet(dbf_path, parquet_path, start_date=None):
+    """
+    Igual que convert_dbf_to_csv, pero guarda la tabla transformada en Parquet
+    comprimido, conservando los tipos de cada columna.
+    """
+    try:
+        dbf_path = os.path.abspath(dbf_path)
+        parquet_path = os.path.abspath(parquet_path)
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+
+        if not os.path.exists(dbf_path):
+            raise FileNotFoundError(f"El archivo DBF no existe: {dbf_path}")
+
+        os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+
+        df = read_dbf_table(dbf_path, start_date)
+        with metrics.stage('write'):
+            df.to_parquet(parquet_path, index=False, compression='zstd')
+        metrics.add_rows('write', len(df), len(df))
+
+    except FileNotFoundError:
+        raise
     except Exception as e:
-        print(f"Error en la conversión del archivo DBF: {e}")
+        raise Exception(f"Error en la conversión del archivo DBF: {e}")
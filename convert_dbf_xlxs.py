@@ -1,5 +1,7 @@
-import subprocess
 import os
+import pandas as pd
+from dbf_reader import DBFReader, format_csv_value
+from fields import get_table_columns
 # Asumiendo que tienes una función equivalente a process_csv para XLSX
 from process_xlsx import process_xlsx
 
@@ -17,32 +19,20 @@ def convert_dbf_to_xlsx(dbf_path, xlsx_path):
         # Crear la carpeta de destino si no existe
         os.makedirs(os.path.dirname(xlsx_path), exist_ok=True)
 
-        # Ruta al ejecutable de DBF Viewer 2000
-        dbf_viewer_path = r"C:\Program Files (x86)\DBF Viewer 2000\dbview.exe"
-
-        # Construir el comando para convertir el archivo DBF a XLSX
-        command = [
-            dbf_viewer_path,
-            dbf_path,
-            f"/export:{xlsx_path}",
-            "/SKIPD",  # Omitir registros eliminados
-        ]
-
-        # Ejecutar el comando
-        subprocess.run(
-            command, creationflags=subprocess.CREATE_NO_WINDOW, check=True)
-
-        # Verificar si el archivo XLSX fue generado
-        if not os.path.exists(xlsx_path):
-            raise FileNotFoundError(
-                f"El archivo XLSX no fue generado: {xlsx_path}")
+        # Leer el DBF directamente (omitiendo registros eliminados, como /SKIPD),
+        # solo con los campos definidos en el esquema de la tabla
+        table_name = os.path.splitext(os.path.basename(dbf_path))[0].upper()
+        columns = get_table_columns(table_name)
+        reader = DBFReader(dbf_path, skip_deleted=True)
+        df = pd.DataFrame(
+            ([format_csv_value(value) for value in record]
+             for record in reader.iter_records(columns)),
+            columns=[field.name for field in reader.select_fields(columns)])
+        df.to_excel(xlsx_path, index=False, engine='openpyxl')
 
         # Procesar el archivo XLSX resultante
-        table_name = os.path.splitext(os.path.basename(dbf_path))[0].upper()
         process_xlsx(xlsx_path, table_name)
 
-    except subprocess.CalledProcessError as e:
-        raise Exception(f"Error al ejecutar DBF Viewer 2000: {e}")
     except FileNotFoundError as e:
         print(f"Archivo no encontrado: {e}")
     except Exception as e:
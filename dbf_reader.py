@@ -0,0 +1,585 @@
+import mmap
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from fpt_reader import FPTReader, find_memo_file
+
+
+# Descriptor de un campo de la tabla DBF
+DBFField = namedtuple('DBFField', ['name', 'type', 'offset', 'length', 'decimals'])
+
+# Versiones de Visual FoxPro (campos B e I binarios, backlink de 263 bytes)
+VFP_VERSIONS = (0x30, 0x31, 0x32)
+
+# Desfase entre el día juliano y el ordinal de datetime.date
+JULIAN_ORDINAL_OFFSET = 1721425
+
+# Día juliano del 01/01/1970 (época de datetime64)
+JULIAN_EPOCH = 2440588
+
+# Tamaño de lectura por bloque al recorrer los registros
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Filas usadas para estimar la cardinalidad de una columna de texto
+CARDINALITY_SAMPLE = 4096
+
+# Registros mínimos por fragmento al decodificar en paralelo
+MIN_CHUNK_RECORDS = 50000
+
+
+def _decode_char(raw, encoding):
+    return raw.decode(encoding).rstrip()
+
+
+def _decode_numeric(raw, decimals):
+    text = raw.strip()
+    if not text or text.startswith(b'*'):
+        return None
+    try:
+        if decimals:
+            return float(text)
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+def _decode_date(raw):
+    text = raw.strip()
+    if not text or text == b'00000000':
+        return None
+    try:
+        return date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+    except ValueError:
+        return None
+
+
+def _decode_logical(raw):
+    if raw in b'TtYy':
+        return True
+    if raw in b'FfNn':
+        return False
+    return None
+
+
+def _decode_memo_block(raw):
+    # Visual FoxPro guarda el bloque como entero binario; FoxPro 2.x como texto
+    if len(raw) == 4:
+        return struct.unpack('<I', raw)[0]
+    text = raw.strip()
+    return int(text) if text.isdigit() else 0
+
+
+def _decode_datetime(raw):
+    julian_day, milliseconds = struct.unpack('<ii', raw)
+    if julian_day <= 0:
+        return None
+    day = date.fromordinal(julian_day - JULIAN_ORDINAL_OFFSET)
+    return datetime(day.year, day.month, day.day) + timedelta(milliseconds=milliseconds)
+
+
+class DBFReader:
+    """
+    Lee una tabla DBF (FoxPro / Visual FoxPro) directamente desde el archivo,
+    sin depender de un exportador externo.
+    """
+
+    def __init__(self, dbf_path, encoding='latin-1', skip_deleted=True):
+        self.dbf_path = dbf_path
+        self.encoding = encoding
+        # Equivalente a /SKIPD del exportador: omitir registros eliminados
+        self.skip_deleted = skip_deleted
+        self.memo_path = find_memo_file(dbf_path)
+        self._read_header()
+
+    def _read_header(self):
+        """Lee la cabecera y los descriptores de campo."""
+        with open(self.dbf_path, 'rb') as f:
+            header = f.read(32)
+            if len(header) < 32:
+                raise Exception(f"Cabecera DBF inválida: {self.dbf_path}")
+
+            (self.version, year, month, day, self.record_count,
+             self.header_length, self.record_length) = struct.unpack('<BBBBIHH', header[:12])
+            # FoxPro guarda el año con dos dígitos
+            year += 2000 if year < 80 else 1900
+            try:
+                self.last_update = date(year, month, day)
+            except ValueError:
+                self.last_update = None
+
+            descriptors = f.read(self.header_length - 32)
+
+        self.fields = []
+        # El primer byte de cada registro es la marca de eliminado
+        offset = 1
+        for start in range(0, len(descriptors), 32):
+            descriptor = descriptors[start:start + 32]
+            if not descriptor or descriptor[0] == 0x0D or len(descriptor) < 32:
+                break
+            name = descriptor[:11].split(b'\x00', 1)[0].decode('ascii').strip().upper()
+            field_type = chr(descriptor[11])
+            length = descriptor[16]
+            decimals = descriptor[17]
+            # _NullFlags es un campo oculto de Visual FoxPro
+            if field_type != '0':
+                self.fields.append(
+                    DBFField(name, field_type, offset, length, decimals))
+            offset += length
+
+        if offset > self.record_length:
+            raise Exception(
+                f"Longitud de registro inconsistente en {self.dbf_path}")
+
+    @property
+    def field_names(self):
+        return [field.name for field in self.fields]
+
+    def select_fields(self, columns=None):
+        """
+        Devuelve los campos a decodificar, en el orden del DBF. Los nombres se
+        comparan sin distinguir mayúsculas y los que no existen se ignoran.
+        """
+        if columns is None:
+            return list(self.fields)
+        wanted = {column.upper() for column in columns}
+        return [field for field in self.fields if field.name in wanted]
+
+    def _is_memo(self, field):
+        if field.type in 'MGW':
+            return True
+        return field.type == 'B' and self.version not in VFP_VERSIONS
+
+    def _open_memo_file(self, fields):
+        """
+        Abre el .FPT solo si alguno de los campos a decodificar es memo.
+        Devuelve None si no hace falta o si el archivo no existe.
+        """
+        if not any(self._is_memo(field) for field in fields):
+            return None
+        if self.memo_path is None:
+            print(f"Archivo FPT no encontrado para {self.dbf_path}; los memos quedarán vacíos")
+            return None
+        return FPTReader(self.memo_path, encoding=self.encoding)
+
+    def _build_decoder(self, field, memo=None):
+        """Devuelve la función que convierte los bytes crudos de un campo."""
+        encoding = self.encoding
+        field_type = field.type
+        if field_type in 'CV':
+            return lambda raw: _decode_char(raw, encoding)
+        if field_type in 'NF':
+            decimals = field.decimals
+            return lambda raw: _decode_numeric(raw, decimals)
+        if field_type == 'D':
+            return _decode_date
+        if field_type == 'L':
+            return _decode_logical
+        if field_type == 'I':
+            return lambda raw: struct.unpack('<i', raw)[0]
+        if field_type == 'Y':
+            return lambda raw: struct.unpack('<q', raw)[0] / 10000
+        if field_type == 'T':
+            return _decode_datetime
+        if field_type == 'B' and self.version in VFP_VERSIONS:
+            return lambda raw: struct.unpack('<d', raw)[0]
+        # Campos memo (M, G, W y B en dBase): el contenido está en el archivo .FPT
+        if self._is_memo(field) and memo is not None:
+            as_text = field_type == 'M'
+            return lambda raw: memo.read_memo(_decode_memo_block(raw), as_text)
+        return lambda raw: None
+
+    def _date_filter_bounds(self, date_filters):
+        """
+        Traduce {campo: (inicio, fin)} a los límites en bytes YYYYMMDD de cada
+        campo fecha, comparables directamente con el valor crudo del registro.
+        """
+        if not date_filters:
+            return []
+        fields = {field.name: field for field in self.fields}
+        bounds = []
+        for name, (start, end) in date_filters.items():
+            field = fields.get(name.upper())
+            if field is None or field.type != 'D':
+                continue
+            # Las fechas vacías quedan fuera del rango, como con pd.to_datetime
+            low = pd.Timestamp(start).strftime('%Y%m%d').encode() if start else b'00000101'
+            high = pd.Timestamp(end).strftime('%Y%m%d').encode() if end else b'99991231'
+            bounds.append((field, low, high))
+        return bounds
+
+    def iter_records(self, columns=None, date_filters=None):
+        """
+        Genera cada registro como una lista de valores en el orden de los campos.
+        Con `columns` solo se decodifican los campos indicados y con
+        `date_filters` ({campo: (inicio, fin)}) se descartan los registros fuera
+        de rango antes de decodificar el resto de campos.
+        """
+        fields = self.select_fields(columns)
+        memo = self._open_memo_file(fields)
+        decoders = [(field.offset, field.offset + field.length, self._build_decoder(field, memo))
+                    for field in fields]
+        filters = [(field.offset, field.offset + field.length, low, high)
+                   for field, low, high in self._date_filter_bounds(date_filters)]
+        record_length = self.record_length
+        records_per_block = max(1, READ_BUFFER_SIZE // record_length)
+        remaining = self.record_count
+        skip_deleted = self.skip_deleted
+
+        try:
+            with open(self.dbf_path, 'rb') as f:
+                f.seek(self.header_length)
+                while remaining > 0:
+                    count = min(records_per_block, remaining)
+                    block = f.read(count * record_length)
+                    # Archivo truncado: procesar solo los registros completos
+                    count = min(count, len(block) // record_length)
+                    if count == 0:
+                        break
+                    remaining -= count
+
+                    for position in range(0, count * record_length, record_length):
+                        record = block[position:position + record_length]
+                        if skip_deleted and record[0] == 0x2A:  # '*'
+                            continue
+                        if filters and not all(low <= record[start:end] <= high
+                                               for start, end, low, high in filters):
+                            continue
+                        yield [decode(record[start:end]) for start, end, decode in decoders]
+        finally:
+            if memo is not None:
+                memo.close()
+
+    def __iter__(self):
+        return self.iter_records()
+
+    def _raw_format(self, field):
+        """Formato NumPy de los bytes crudos de un campo."""
+        if field.type == 'I':
+            return '<i4'
+        if field.type == 'Y':
+            return '<i8'
+        if field.type == 'T':
+            return '<i8'
+        if field.type == 'B' and self.version in VFP_VERSIONS:
+            return '<f8'
+        if field.type in 'MGWB' and field.length == 4:
+            return '<u4'
+        return f'S{field.length}'
+
+    def _record_dtype(self, fields):
+        """dtype estructurado que describe un registro completo."""
+        return np.dtype({
+            'names': ['_deleted'] + [field.name for field in fields],
+            'formats': ['S1'] + [self._raw_format(field) for field in fields],
+            'offsets': [0] + [field.offset for field in fields],
+            'itemsize': self.record_length,
+        })
+
+    def _decode_column(self, field, raw, memo=None):
+        """Convierte en bloque la columna cruda de un campo."""
+        field_type = field.type
+        if field_type in 'CV':
+            return _decode_char_column(raw, self.encoding)
+        if field_type in 'NF':
+            return _decode_numeric_column(raw, field.decimals)
+        if field_type == 'D':
+            return _decode_date_column(raw)
+        if field_type == 'L':
+            return _decode_logical_column(raw)
+        if field_type == 'I':
+            return raw.astype(np.int64)
+        if field_type == 'Y':
+            return raw / 10000
+        if field_type == 'T':
+            return _decode_datetime_column(raw)
+        if field_type == 'B' and self.version in VFP_VERSIONS:
+            return raw.astype(np.float64)
+        # Campos memo (M, G, W y B en dBase): el contenido está en el archivo .FPT
+        if self._is_memo(field) and memo is not None:
+            return _decode_memo_column(raw, memo, as_text=field_type == 'M')
+        return np.full(len(raw), None, dtype=object)
+
+    def _available_records(self, file_size):
+        """Registros completos presentes en el archivo (puede estar truncado)."""
+        return min(self.record_count,
+                   max(0, file_size - self.header_length) // self.record_length)
+
+    def read_raw_records(self, start, stop):
+        """Devuelve los bytes crudos de los registros [start, stop)."""
+        with open(self.dbf_path, 'rb') as f:
+            f.seek(self.header_length + start * self.record_length)
+            return f.read(max(0, stop - start) * self.record_length)
+
+    def _records(self, mm, dtype, available, start, stop, positions=None):
+        """
+        Registros [start, stop) como arreglo estructurado sobre el mmap o, con
+        `positions`, solo los registros de esas posiciones (una copia).
+        """
+        if positions is None:
+            return np.frombuffer(mm, dtype=dtype, count=stop - start,
+                                 offset=self.header_length + start * self.record_length)
+        records = np.frombuffer(mm, dtype=dtype, count=available, offset=self.header_length)
+        return records[positions]
+
+    def _valid_positions(self, positions, available):
+        positions = np.asarray(positions, dtype=np.int64)
+        return positions[(positions >= 0) & (positions < available)]
+
+    def to_dataframe(self, columns=None, date_filters=None, start=0, stop=None, positions=None):
+        """
+        Decodifica la tabla por columnas sobre un mmap del archivo, sin
+        recorrer los registros uno a uno. Con `columns` los demás campos no se
+        leen ni se decodifican; con `date_filters` ({campo: (inicio, fin)}) los
+        registros fuera de rango se descartan sobre la fecha cruda, antes de
+        decodificar las columnas. `start` y `stop` limitan el rango de
+        registros (índices desde 0, como en un slice); `positions` reemplaza
+        el rango por una lista de posiciones sueltas. Los registros descartados
+        se cuentan en df.attrs['dropped'] como 'deleted' y 'date:<campo>'.
+        """
+        fields = self.select_fields(columns)
+        bounds = self._date_filter_bounds(date_filters)
+        # Los campos de filtro se leen aunque no estén en la proyección
+        filter_fields = [field for field, _, _ in bounds if field not in fields]
+        dtype = self._record_dtype(fields + filter_fields)
+
+        with open(self.dbf_path, 'rb') as f:
+            available = self._available_records(f.seek(0, 2))
+            stop = available if stop is None else min(stop, available)
+            if positions is not None:
+                positions = self._valid_positions(positions, available)
+            count = max(0, stop - start) if positions is None else len(positions)
+            if count == 0:
+                return pd.DataFrame(columns=[field.name for field in fields], dtype=object)
+
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            memo = None
+            try:
+                memo = self._open_memo_file(fields)
+                records = self._records(mm, dtype, available, start, stop, positions)
+
+                keep = None
+                dropped = {}
+                if self.skip_deleted:
+                    keep = records['_deleted'] != b'*'
+                    dropped['deleted'] = count - np.count_nonzero(keep)
+                for field, low, high in bounds:
+                    raw = records[field.name]
+                    in_range = (raw >= low) & (raw <= high)
+                    kept = count if keep is None else np.count_nonzero(keep)
+                    keep = in_range if keep is None else keep & in_range
+                    dropped[f"date:{field.name.lower()}"] = kept - np.count_nonzero(keep)
+                if keep is not None and keep.all():
+                    keep = None
+
+                columns = {}
+                for field in fields:
+                    raw = records[field.name]
+                    if keep is not None:
+                        raw = raw[keep]
+                    columns[field.name] = self._decode_column(field, raw, memo)
+
+                # Liberar las vistas antes de cerrar el mmap
+                del records
+                raw = None
+            finally:
+                if memo is not None:
+                    memo.close()
+                mm.close()
+
+        # Con la lista de columnas explícita el índice de columnas es de texto aun si está vacío
+        df = pd.DataFrame(columns, columns=[field.name for field in fields])
+        df.attrs['dropped'] = {name: int(rows) for name, rows in dropped.items() if rows}
+        return df
+
+    def records_after(self, date_filters, start=0, stop=None, positions=None):
+        """
+        Posiciones de los registros (no eliminados) con una fecha posterior al
+        fin de su rango en `date_filters`: el filtro de fechas los descarta hoy
+        pero entrarán en el rango más adelante. Con `positions` solo se revisan
+        esas posiciones.
+        """
+        bounds = [(field, high) for field, _, high in self._date_filter_bounds(date_filters)]
+        with open(self.dbf_path, 'rb') as f:
+            available = self._available_records(f.seek(0, 2))
+            stop = available if stop is None else min(stop, available)
+            if positions is not None:
+                positions = self._valid_positions(positions, available)
+            if not bounds or (stop <= start if positions is None else not len(positions)):
+                return []
+
+            dtype = self._record_dtype([field for field, _ in bounds])
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                records = self._records(mm, dtype, available, start, stop, positions)
+                after = np.zeros(len(records), dtype=bool)
+                for field, high in bounds:
+                    after |= records[field.name] > high
+                if self.skip_deleted:
+                    after &= records['_deleted'] != b'*'
+                if positions is None:
+                    positions = (start + np.flatnonzero(after)).tolist()
+                else:
+                    positions = positions[after].tolist()
+                # Liberar la vista antes de cerrar el mmap
+                del records
+            finally:
+                mm.close()
+        return positions
+
+    def record_ranges(self, chunk_records, start=0, stop=None):
+        """Divide los registros [start, stop) en rangos de `chunk_records`."""
+        stop = self.record_count if stop is None else min(stop, self.record_count)
+        return [(position, min(position + chunk_records, stop))
+                for position in range(start, stop, chunk_records)]
+
+    def iter_dataframes(self, columns=None, date_filters=None, chunk_records=MIN_CHUNK_RECORDS,
+                        workers=1, start=0, stop=None):
+        """
+        Decodifica la tabla por fragmentos de registros y genera un DataFrame
+        por fragmento, en el orden de los registros. Como los registros son de
+        ancho fijo, cada fragmento se decodifica por separado; con `workers`
+        mayor a 1 se reparten en un pool de procesos.
+        """
+        ranges = self.record_ranges(chunk_records, start, stop)
+        if workers <= 1 or len(ranges) <= 1:
+            for chunk_start, chunk_stop in ranges:
+                yield self.to_dataframe(columns, date_filters, chunk_start, chunk_stop)
+            return
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+            futures = [executor.submit(_decode_chunk, self.dbf_path, self.encoding, self.skip_deleted,
+                                       columns, date_filters, chunk_start, chunk_stop)
+                       for chunk_start, chunk_stop in ranges]
+            for future in futures:
+                yield future.result()
+
+    def to_dataframe_parallel(self, columns=None, date_filters=None, workers=2, start=0, stop=None):
+        """
+        Igual que to_dataframe, pero repartiendo el rango de registros entre
+        `workers` procesos y uniendo los resultados en orden.
+        """
+        stop = self.record_count if stop is None else min(stop, self.record_count)
+        chunk_records = max(MIN_CHUNK_RECORDS, -(-(stop - start) // max(1, workers)))
+        frames = list(self.iter_dataframes(
+            columns, date_filters, chunk_records, workers, start, stop))
+        if len(frames) <= 1:
+            return frames[0] if frames else self.to_dataframe(columns, date_filters, start, stop)
+        dropped = {}
+        for frame in frames:
+            for name, rows in frame.attrs.get('dropped', {}).items():
+                dropped[name] = dropped.get(name, 0) + rows
+        df = pd.concat(frames, ignore_index=True)
+        df.attrs['dropped'] = dropped
+        return df
+
+    def __len__(self):
+        return self.record_count
+
+
+def _decode_chunk(dbf_path, encoding, skip_deleted, columns, date_filters, start, stop):
+    """Decodifica un rango de registros en un proceso del pool."""
+    reader = DBFReader(dbf_path, encoding=encoding, skip_deleted=skip_deleted)
+    return reader.to_dataframe(columns, date_filters, start, stop)
+
+
+def _decode_char_column(raw, encoding):
+    # Las columnas con muchos valores repetidos se decodifican una vez por valor
+    sample = raw[:CARDINALITY_SAMPLE]
+    if len(pd.unique(sample)) * 2 < len(sample):
+        codes, uniques = pd.factorize(raw)
+        decoded = np.array([value.decode(encoding).rstrip() or None
+                            for value in uniques.tolist()], dtype=object)
+        return decoded[codes]
+    return np.array([value.decode(encoding).rstrip() or None
+                     for value in raw.tolist()], dtype=object)
+
+
+def _decode_numeric_column(raw, decimals):
+    stripped = np.char.strip(raw)
+    present = (stripped != b'') & ~np.char.startswith(stripped, b'*')
+    values = np.full(len(raw), np.nan)
+    try:
+        values[present] = stripped[present].astype(np.float64)
+    except ValueError:
+        values[present] = pd.to_numeric(
+            pd.Series(stripped[present]).str.decode('latin-1'), errors='coerce')
+    if decimals:
+        return values
+    present &= ~np.isnan(values)
+    if (values[present] != np.round(values[present])).any():
+        return values
+    return pd.array(values, dtype='Int64')
+
+
+def _decode_date_column(raw):
+    digits = np.ascontiguousarray(raw).view(np.uint8).reshape(len(raw), 8).astype(np.int32) - 48
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    digits[~valid] = 0
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    valid &= year > 0
+    # Las filas inválidas se convierten en NaT
+    year[~valid] = 1970
+    month[~valid] = 1
+    day[~valid] = 1
+    dates = pd.to_datetime(
+        pd.DataFrame({'year': year, 'month': month, 'day': day}), errors='coerce')
+    dates[~valid] = pd.NaT
+    return dates.to_numpy()
+
+
+def _decode_logical_column(raw):
+    values = pd.array(np.zeros(len(raw), dtype=bool), dtype='boolean')
+    true = np.isin(raw, [b'T', b't', b'Y', b'y'])
+    false = np.isin(raw, [b'F', b'f', b'N', b'n'])
+    values[true] = True
+    values[~(true | false)] = pd.NA
+    return values
+
+
+def _decode_memo_column(raw, memo, as_text):
+    if raw.dtype.kind == 'S':
+        stripped = np.char.strip(raw)
+        present = np.char.isdigit(stripped)
+        blocks = np.zeros(len(raw), dtype=np.int64)
+        blocks[present] = stripped[present].astype(np.int64)
+    else:
+        blocks = raw.astype(np.int64)
+    # Cada memo se lee una sola vez y en el orden del archivo .FPT
+    uniques, inverse = np.unique(blocks, return_inverse=True)
+    decoded = np.empty(len(uniques), dtype=object)
+    for position, block in enumerate(uniques.tolist()):
+        decoded[position] = memo.read_memo(block, as_text)
+    return decoded[inverse]
+
+
+def _decode_datetime_column(raw):
+    julian_day = (raw & 0xFFFFFFFF).astype(np.int64)
+    milliseconds = raw >> 32
+    values = ((julian_day - JULIAN_EPOCH) * 86400000 + milliseconds).astype('datetime64[ms]')
+    values[julian_day <= 0] = np.datetime64('NaT')
+    return values
+
+
+def format_csv_value(value):
+    """Da formato a un valor igual que el exportador de DBF Viewer 2000."""
+    if value is None:
+        return ''
+    if value is True:
+        return 'T'
+    if value is False:
+        return 'F'
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    return value
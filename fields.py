@@ -1,3 +1,8 @@
+from datetime import date
+
+# Fecha mínima por defecto de los registros que se migran
+DATE_FILTER_START = '2023-01-01'
+
 PREDEFINED_FIELDS = {
     'SC0011': {
         'fields': {
@@ -17,7 +22,11 @@ PREDEFINED_FIELDS = {
             'TOT_DOC': 'DECIMAL(10,2)',
             'CLOS_DOC': 'BOOLEAN',
         },
-        'primary_key': 'NUM_DOC'
+        'primary_key': 'NUM_DOC',
+        'date_filters': {'FEC_DOC': {'start': DATE_FILTER_START}},
+        # Índices secundarios (la llave primaria no se repite); se crean después
+        # de cargar los datos
+        'indexes': ['COD_SER', 'COD_EMP', 'COD_PAC', 'FEC_DOC', 'TOT_DOC', 'NOM_PAC']
     },
     'SC0006': {
         'fields': {
@@ -103,7 +112,8 @@ PREDEFINED_FIELDS = {
             'EST_PAC': 'DECIMAL(10,2)',
             'NUM_DOC': 'VARCHAR(255)'  # Llave foránea
         },
-        'primary_key': 'ID_PAC'
+        'primary_key': 'ID_PAC',
+        'indexes': ['COD_PAC']
     },
     'SC0033': {
         'fields': {
@@ -132,7 +142,9 @@ PREDEFINED_FIELDS = {
             'UM_SIS': 'VARCHAR(255)',
             'FC_SIS': 'VARCHAR(255)',
         },
-        'primary_key': 'ID_DEV'
+        'primary_key': 'ID_DEV',
+        'date_filters': {'FEC_DOC': {'start': DATE_FILTER_START}},
+        'indexes': ['NUM_DOC']
     },
     'SC0017': {
         'fields': {
@@ -182,7 +194,8 @@ PREDEFINED_FIELDS = {
             'FC_SIS': 'VARCHAR(255)',
             'UM_SIS': 'VARCHAR(255)',
         },
-        'primary_key': 'NUM_FAC'
+        'primary_key': 'NUM_FAC',
+        'indexes': ['NUM_DOC']
     },
     'SC0002': {
         'fields': {
@@ -199,7 +212,8 @@ PREDEFINED_FIELDS = {
             'TF_CIA': 'VARCHAR(255)',
             'CON_CIA': 'BOOLEAN',
         },
-        'primary_key': 'ID_CIA'
+        'primary_key': 'ID_CIA',
+        'indexes': ['COD_CIA', 'NOM_CIA']
     },
     'SC0012': {
         'fields': {
@@ -231,7 +245,8 @@ PREDEFINED_FIELDS = {
             'UM_SIS': 'VARCHAR(255)',
             'DTO_SER': 'DECIMAL(10,2)',
             'ISDTO_SER': 'DECIMAL(10,2)',
-        }
+        },
+        'date_filters': {'FEC_SER': {'start': DATE_FILTER_START}}
     },
     'SC0022': {
         'fields': {
@@ -243,5 +258,52 @@ PREDEFINED_FIELDS = {
             'ORI_PAG': 'VARCHAR(255)',
             'NUM_NC': 'VARCHAR(255)'
         },
+        'indexes': ['NUM_FAC']
     }
 }
+
+
+# Reglas de limpieza por columna, comunes a todas las tablas:
+#   numeric: 'round' redondea y 'truncate' trunca al convertir a entero
+#   zfill: ancho con ceros a la izquierda
+#   required: descartar la fila si el valor no es numérico o está vacío
+COLUMN_RULES = {
+    'NUM_DOC': {'numeric': 'round', 'zfill': 10, 'required': True},
+    'COD_SER': {'numeric': 'round', 'required': True},
+    'PER_DEV': {'numeric': 'round', 'required': True},
+    'COD_PAC': {'numeric': 'round', 'required': True},
+    'NH_PAC': {'numeric': 'round', 'required': True},
+    'COD_CIA': {'numeric': 'truncate', 'zfill': 2, 'required': True},
+    'ID_PAC': {'numeric': 'truncate', 'required': True},
+}
+
+# Formato de los campos de fecha en los archivos de origen, por tipo
+DATE_FORMATS = {
+    'DATE': '%d/%m/%Y',
+}
+
+# Valores de los campos BOOLEAN en los archivos de origen
+BOOLEAN_VALUES = {'F': 0, 'T': 1, 'f': 0, 't': 1, '0': 0, '1': 1, False: 0, True: 1}
+
+
+def get_table_columns(table_name):
+    """Campos del esquema de la tabla, o None si la tabla no está definida."""
+    fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields')
+    if not fields:
+        return None
+    return list(fields.keys())
+
+
+def get_date_filters(table_name, start_date=None, end_date=None):
+    """
+    Rangos de fecha de la tabla como {campo: (inicio, fin)}, ambos inclusive.
+    `start_date` y `end_date` reemplazan los límites configurados; sin fin
+    configurado se usa la fecha de hoy.
+    """
+    date_filters = PREDEFINED_FIELDS.get(table_name, {}).get('date_filters', {})
+    ranges = {}
+    for field, bounds in date_filters.items():
+        start = start_date or bounds.get('start')
+        end = end_date or bounds.get('end') or date.today()
+        ranges[field] = (start, end)
+    return ranges
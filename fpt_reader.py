@@ -0,0 +1,114 @@
+import os
+import struct
+from collections import OrderedDict
+
+
+# Tamaño de las páginas que se leen del archivo y se guardan en la caché
+PAGE_SIZE = 64 * 1024
+
+# Páginas que conserva la caché LRU (16 MB con el tamaño por defecto)
+CACHE_PAGES = 256
+
+# Tipos de memo del encabezado de cada bloque
+MEMO_TYPE_PICTURE = 0
+MEMO_TYPE_TEXT = 1
+
+
+def find_memo_file(dbf_path):
+    """Devuelve la ruta del archivo .FPT que acompaña al DBF, si existe."""
+    base = os.path.splitext(dbf_path)[0]
+    for extension in ('.FPT', '.fpt', '.Fpt'):
+        if os.path.exists(base + extension):
+            return base + extension
+    return None
+
+
+class FPTReader:
+    """
+    Lee memos de un archivo .FPT de FoxPro bajo demanda. El archivo se lee por
+    páginas y una caché LRU sirve las lecturas repetidas o contiguas, sin
+    cargar el archivo completo en memoria.
+    """
+
+    def __init__(self, fpt_path, encoding='latin-1', cache_pages=CACHE_PAGES, page_size=PAGE_SIZE):
+        self.fpt_path = fpt_path
+        self.encoding = encoding
+        self.cache_pages = cache_pages
+        self.page_size = page_size
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+
+        self._file = open(fpt_path, 'rb')
+        header = self._file.read(8)
+        if len(header) < 8:
+            self._file.close()
+            raise Exception(f"Cabecera FPT inválida: {fpt_path}")
+        self.next_block, self.block_size = struct.unpack('>IxxH', header)
+        if not self.block_size:
+            self.block_size = 64
+
+    def _page(self, index):
+        page = self._pages.get(index)
+        if page is not None:
+            self.hits += 1
+            self._pages.move_to_end(index)
+            return page
+
+        self.misses += 1
+        self._file.seek(index * self.page_size)
+        page = self._file.read(self.page_size)
+        self._pages[index] = page
+        if len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return page
+
+    def _read(self, offset, size):
+        """Lee `size` bytes desde `offset` a través de la caché de páginas."""
+        # Los memos muy grandes se leen directo para no vaciar la caché
+        if size > self.page_size * 4:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+        chunks = []
+        while size > 0:
+            index, start = divmod(offset, self.page_size)
+            page = self._page(index)
+            chunk = page[start:start + size]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def read_memo(self, block, as_text=True):
+        """
+        Devuelve el contenido del memo que empieza en `block`. Los memos de
+        texto se decodifican salvo que `as_text` sea False; los bloques vacíos
+        o inválidos devuelven None.
+        """
+        if block <= 0:
+            return None
+        offset = block * self.block_size
+        header = self._read(offset, 8)
+        if len(header) < 8:
+            return None
+        memo_type, length = struct.unpack('>II', header)
+        if not length:
+            return None
+
+        data = self._read(offset + 8, length)
+        if as_text and memo_type == MEMO_TYPE_TEXT:
+            return data.decode(self.encoding)
+        return data
+
+    def close(self):
+        self._pages.clear()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
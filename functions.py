@@ -1,47 +1,332 @@
 # functions.py (o directamente en el archivo principal)
 import os
+import queue
 import time
-from convert_dbf_csv import convert_dbf_to_csv
-from import_csv_mysql import migrate_to_mysql
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import Manager
+import metrics
+from convert_dbf_csv import (convert_dbf_to_csv, convert_dbf_to_parquet, iter_dbf_table,
+                             read_dbf_table)
+from dbf_reader import DBFReader
+from change_detection import (build_snapshot, clear_snapshot, diff_snapshot,
+                              load_snapshot, save_snapshot)
+from fields import PREDEFINED_FIELDS, get_date_filters
+from import_csv_mysql import (apply_changes_to_mysql, migrate_dataframes_to_mysql,
+                              migrate_to_mysql)
+from mysql_pool import get_mysql_config
+from sync_state import (build_sync_state, clear_sync_state, get_append_start,
+                        load_sync_state, save_sync_state)
 
 
-def run_migration_logic(path_databases, output_folder, tables, logger=None):
+# Modos de run_migration_logic (SYNC_MODE)
+SYNC_MODES = ('full', 'append', 'upsert')
+
+
+def sync_table_append(dbf_path, csv_path, table, output_folder, mysql_config):
+    """
+    Carga incremental: inserta solo los registros agregados al DBF desde la
+    última sincronización. Si el archivo fue reescrito (por ejemplo con un
+    PACK) o no hay estado previo, recarga la tabla completa. Los registros con
+    fecha futura, que el filtro de fechas descarta hoy, quedan pendientes y se
+    vuelven a revisar en cada corrida hasta que entran en el rango.
+    """
+    reader = DBFReader(dbf_path, skip_deleted=True)
+    previous_state = load_sync_state(output_folder, table)
+    start = get_append_start(reader, previous_state)
+    date_filters = get_date_filters(table)
+
+    # Pendientes de la corrida anterior que ya entraron en el rango de fechas
+    pending = previous_state.get('pending_records', []) if start is not None else []
+    still_pending = reader.records_after(date_filters, positions=pending) if pending else []
+    ready = sorted(set(pending) - set(still_pending))
+    new_state = build_sync_state(
+        reader, still_pending + reader.records_after(date_filters, start or 0))
+
+    if start is None:
+        df = read_dbf_table(dbf_path, reader=reader)
+        df.to_csv(csv_path, index=False, encoding='latin-1')
+        message = migrate_to_mysql(csv_path, table, mysql_config)
+    elif start == reader.record_count and not ready:
+        message = f"Table {table}: no new rows since last sync."
+    else:
+        frames = []
+        if ready:
+            frames.append(read_dbf_table(dbf_path, reader=reader, positions=ready))
+        if start < reader.record_count:
+            frames.append(read_dbf_table(dbf_path, start=start, reader=reader))
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        delta_path = os.path.join(output_folder, f"{table}.delta.csv")
+        df.to_csv(delta_path, index=False, encoding='latin-1')
+        try:
+            message = migrate_to_mysql(delta_path, table, mysql_config, append=True)
+        except Exception:
+            # Forzar una recarga completa en la próxima corrida
+            clear_sync_state(output_folder, table)
+            raise
+
+    save_sync_state(output_folder, table, new_state)
+    return message
+
+
+def sync_table_upsert(dbf_path, csv_path, table, output_folder, mysql_config):
+    """
+    Carga por cambios: compara el hash de cada fila con el snapshot de la
+    última carga y aplica solo las inserciones, actualizaciones y
+    eliminaciones. Sin snapshot previo recarga la tabla completa.
+    """
+    primary_key = PREDEFINED_FIELDS.get(table, {}).get('primary_key')
+    df = read_dbf_table(dbf_path)
+    df.columns = df.columns.str.upper()
+
+    if not primary_key or primary_key not in df.columns:
+        # Sin llave primaria no se pueden identificar las filas
+        df.to_csv(csv_path, index=False, encoding='latin-1')
+        return migrate_to_mysql(csv_path, table, mysql_config)
+
+    df, keys, hashes = build_snapshot(df, primary_key)
+    snapshot = load_snapshot(output_folder, table)
+
+    if snapshot is None:
+        df.to_csv(csv_path, index=False, encoding='latin-1')
+        message = migrate_to_mysql(csv_path, table, mysql_config)
+    else:
+        changed_df, deleted_keys, counts = diff_snapshot(df, keys, hashes, snapshot)
+        try:
+            message = apply_changes_to_mysql(
+                changed_df, deleted_keys, table, mysql_config)
+        except Exception:
+            # Forzar una recarga completa en la próxima corrida
+            clear_snapshot(output_folder, table)
+            raise
+        message += f" ({counts['inserted']} new, {counts['updated']} updated)"
+
+    save_snapshot(output_folder, table, keys, hashes)
+    return message
+
+
+def get_table_file(output_folder, table):
+    """
+    Archivo procesado de la tabla. Se prefiere el Parquet, salvo que el CSV
+    sea más reciente (por ejemplo, si se volvió a OUTPUT_FORMAT=csv).
+    """
+    parquet_path = os.path.join(output_folder, f"{table}.parquet")
+    csv_path = os.path.join(output_folder, f"{table}.csv")
+    if not os.path.exists(parquet_path):
+        return csv_path
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(parquet_path):
+        return csv_path
+    return parquet_path
+
+
+def migrate_table(path_databases, output_folder, table, sync_mode='full', logger=None,
+                  streaming=False):
+    """
+    Convierte y migra una sola tabla. Devuelve los mensajes generados; los
+    errores se devuelven como mensaje para no afectar a las demás tablas.
+    Con `streaming` la recarga completa pasa del DBF a MySQL por lotes, sin
+    escribir el CSV intermedio.
+    """
+    messages = []
+
+    def report(message):
+        messages.append(message)
+        if logger:
+            logger(message)
+
+    dbf_path = os.path.join(path_databases, f"{table}.DBF")
+    csv_path = os.path.join(output_folder, f"{table}.csv")
+
+    try:
+        mysql_config = get_mysql_config()
+
+        if sync_mode in ('append', 'upsert'):
+            # Cada modo invalida el estado guardado por el otro
+            with metrics.stage('sync'):
+                if sync_mode == 'append':
+                    clear_snapshot(output_folder, table)
+                    report(sync_table_append(
+                        dbf_path, csv_path, table, output_folder, mysql_config))
+                else:
+                    clear_sync_state(output_folder, table)
+                    report(sync_table_upsert(
+                        dbf_path, csv_path, table, output_folder, mysql_config))
+            return messages
+
+        # La recarga completa invalida el estado de las cargas incrementales
+        clear_sync_state(output_folder, table)
+        clear_snapshot(output_folder, table)
+
+        # MYSQL_LOAD_MODE=infile carga con LOAD DATA LOCAL INFILE
+        bulk = os.getenv('MYSQL_LOAD_MODE', 'insert').lower() == 'infile'
+        # MYSQL_STAGING=1 carga en <tabla>__staging y la intercambia al final
+        staging = os.getenv('MYSQL_STAGING', '0') == '1'
+
+        if streaming:
+            if not os.path.exists(dbf_path):
+                raise FileNotFoundError(f"El archivo DBF no existe: {dbf_path}")
+            batch_size = int(os.getenv('STREAM_BATCH_SIZE', '50000'))
+            # La etapa load incluye la decodificación y la transformación de cada lote
+            with metrics.stage('load'):
+                report(migrate_dataframes_to_mysql(
+                    iter_dbf_table(dbf_path, batch_size=batch_size), table, mysql_config,
+                    bulk=bulk, staging=staging))
+            return messages
+
+        # OUTPUT_FORMAT=parquet guarda la tabla procesada en Parquet con sus tipos
+        if os.getenv('OUTPUT_FORMAT', 'csv').lower() == 'parquet':
+            output_path = os.path.join(output_folder, f"{table}.parquet")
+            convert_dbf_to_parquet(dbf_path, output_path)
+        else:
+            output_path = csv_path
+            convert_dbf_to_csv(dbf_path, output_path)
+        report(f"Successfully converted {dbf_path} to {output_path}")
+
+        with metrics.stage('load'):
+            report(migrate_to_mysql(output_path, table, mysql_config, bulk=bulk, staging=staging))
+    except Exception as e:
+        report(f"Error processing {table}: {str(e)}")
+
+    return messages
+
+
+def migrate_table_with_metrics(path_databases, output_folder, table, sync_mode='full',
+                               logger=None, streaming=False, on_progress=None):
+    """
+    Igual que migrate_table, pero también devuelve las métricas de la tabla
+    (tiempos por etapa, filas, bytes leídos y pico de memoria) como dict.
+    `on_progress` recibe las métricas parciales mientras avanza la tabla.
+    """
+    start_time = time.time()
+    with metrics.collect_table_metrics(table, on_progress) as table_metrics:
+        messages = migrate_table(path_databases, output_folder, table, sync_mode, logger, streaming)
+    result = table_metrics.to_dict()
+    result['seconds'] = time.time() - start_time
+    result['error'] = next((message for message in messages
+                            if message.startswith(f"Error processing {table}")), None)
+    return messages, result
+
+
+def _report_progress(progress, table, result):
+    if progress:
+        progress(table, 'error' if result['error'] else 'done', result)
+
+
+def _drain_progress(progress, updates):
+    """Informa el avance que enviaron los procesos del pool."""
+    while True:
+        try:
+            result = updates.get_nowait()
+        except queue.Empty:
+            return
+        progress(result['table'], 'running', result)
+
+
+def _failed_table_metrics(table, start_time, error):
+    """Métricas de una tabla cuyo proceso del pool falló antes de devolverlas."""
+    result = metrics.TableMetrics(table).to_dict()
+    result['seconds'] = time.time() - start_time
+    result['error'] = error
+    return result
+
+
+def run_migration_logic(path_databases, output_folder, tables, logger=None, sync_mode=None,
+                        workers=None, streaming=None, progress=None):
     """
     Ejecuta la lógica para convertir y migrar tablas DBF a CSV y luego a MySQL.
+    `sync_mode` (por defecto SYNC_MODE, o 'full') puede ser 'full' (recarga
+    completa de cada tabla), 'append' (solo los registros agregados desde la
+    última corrida) o 'upsert' (solo las filas nuevas, modificadas o
+    eliminadas según la llave primaria).
+    `workers` (por defecto MIGRATION_WORKERS, o 1) indica cuántas tablas se
+    procesan en paralelo; los mensajes se devuelven en el orden de `tables`.
+    Con `streaming` (por defecto STREAM_MIGRATION=1) la recarga completa no
+    escribe archivos en output_folder.
+    Las métricas de cada tabla se guardan en el historial de corridas
+    (metrics.record_run), que la API expone en /metrics. `progress`, si se
+    indica, se llama como progress(tabla, estado, métricas) al empezar
+    ('running', sin métricas) y al terminar ('done' o 'error') cada tabla.
     """
     start_time = time.time()
     messages = []
+    table_metrics = []
+
+    if sync_mode is None:
+        sync_mode = os.getenv('SYNC_MODE', 'full').lower()
+    if sync_mode not in SYNC_MODES:
+        raise Exception(f"Modo de sincronización no válido: {sync_mode}")
+    if streaming is None:
+        streaming = os.getenv('STREAM_MIGRATION', '0') == '1'
 
-    os.makedirs(output_folder, exist_ok=True)
+    # Las cargas incrementales guardan su estado en output_folder
+    if not streaming or sync_mode != 'full':
+        os.makedirs(output_folder, exist_ok=True)
 
-    for table in tables:
-        dbf_path = os.path.join(path_databases, f"{table}.DBF")
-        csv_path = os.path.join(output_folder, f"{table}.csv")
+    if workers is None:
+        workers = int(os.getenv('MIGRATION_WORKERS', '1'))
+    workers = max(1, min(workers, len(tables)))
 
+    if workers == 1:
+        for table in tables:
+            on_progress = None
+            if progress:
+                progress(table, 'running', None)
+                on_progress = lambda result, table=table: progress(table, 'running', result)
+            table_messages, result = migrate_table_with_metrics(
+                path_databases, output_folder, table, sync_mode, logger, streaming, on_progress)
+            messages.extend(table_messages)
+            table_metrics.append(result)
+            _report_progress(progress, table, result)
+    else:
+        results = {}
+        pending = list(range(len(tables)))
+        running = {}
+        reported = 0
+        # Los procesos del pool envían el avance de su tabla por esta cola
+        manager = Manager() if progress else None
+        updates = manager.Queue() if manager else None
         try:
-            convert_dbf_to_csv(dbf_path, csv_path)
-            message = f"Successfully converted {dbf_path} to {csv_path}"
-            messages.append(message)
-            if logger:
-                logger(message)
-
-            mysql_config = {
-                'host': os.getenv('MYSQL_HOST', 'localhost'),
-                'user': os.getenv('MYSQL_USER', 'root'),
-                'password': os.getenv('MYSQL_PASS', ''),
-                'database': os.getenv('MYSQL_DB', 'db_sisclin'),
-                'allow_local_infile': True,
-                'charset': 'utf8mb4'
-            }
-            migration_message = migrate_to_mysql(csv_path, table, mysql_config)
-            messages.append(migration_message)
-            if logger:
-                logger(migration_message)
-        except Exception as e:
-            error_message = f"Error processing {table}: {str(e)}"
-            messages.append(error_message)
-            if logger:
-                logger(error_message)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                while pending or running:
+                    # Cada tabla se envía cuando hay un proceso libre, así 'running'
+                    # indica las tablas que realmente se están migrando
+                    while pending and len(running) < workers:
+                        index = pending.pop(0)
+                        if progress:
+                            progress(tables[index], 'running', None)
+                        future = executor.submit(migrate_table_with_metrics, path_databases,
+                                                 output_folder, tables[index], sync_mode, None,
+                                                 streaming, updates.put if updates else None)
+                        running[future] = (index, time.time())
+
+                    done, _ = wait(running, timeout=metrics.PROGRESS_INTERVAL,
+                                   return_when=FIRST_COMPLETED)
+                    # El avance pendiente se informa antes que el final de la tabla
+                    if updates is not None:
+                        _drain_progress(progress, updates)
+                    for future in done:
+                        index, table_start = running.pop(future)
+                        table = tables[index]
+                        try:
+                            results[index] = future.result()
+                        except Exception as e:
+                            error = f"Error processing {table}: {str(e)}"
+                            results[index] = ([error],
+                                              _failed_table_metrics(table, table_start, error))
+                        _report_progress(progress, table, results[index][1])
+
+                    # Mensajes y métricas en el orden de `tables`
+                    while reported in results:
+                        table_messages, result = results.pop(reported)
+                        table_metrics.append(result)
+                        for message in table_messages:
+                            messages.append(message)
+                            if logger:
+                                logger(message)
+                        reported += 1
+        finally:
+            if manager is not None:
+                manager.shutdown()
 
     elapsed_time = time.time() - start_time
     summary_message = f"Tiempo de ejecución: {elapsed_time:.2f} segundos"
@@ -49,4 +334,16 @@ def run_migration_logic(path_databases, output_folder, tables, logger=None):
     if logger:
         logger(summary_message)
 
+    try:
+        metrics.record_run({
+            'started_at': start_time,
+            'duration_seconds': elapsed_time,
+            'sync_mode': sync_mode,
+            'streaming': streaming,
+            'workers': workers,
+            'tables': table_metrics,
+        })
+    except OSError as e:
+        print(f"No se pudo guardar el historial de métricas: {e}")
+
     return messages
@@ -1,129 +1,481 @@
 import mysql.connector
 import csv
+import os
+import re
+import tempfile
 import time
+import pandas as pd
+import metrics
 from fields import PREDEFINED_FIELDS
+from mysql_pool import pooled_connection
 from datetime import datetime
+from functools import lru_cache
 
 
+# Valores distintos de fecha que se recuerdan ya convertidos
+DATE_CACHE_SIZE = 65536
+
+# Tipos del esquema que se verifican antes de cargar un DataFrame
+NUMERIC_TYPES = ('DECIMAL', 'INT', 'BOOLEAN')
+DATETIME_TYPES = ('DATE', 'DATETIME', 'TIMESTAMP')
+
+# Tipo MySQL del esquema: nombre, largo o precisión y decimales
+FIELD_TYPE_PATTERN = re.compile(r'([A-Za-z]+)(?:\((\d+)(?:,\s*(\d+))?\))?')
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def convert_date(value, date_format):
     try:
         return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
-    except ValueError:
+    except (ValueError, TypeError):
         return None
 
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def convert_datetime(value, datetime_format):
     try:
         return datetime.strptime(value, datetime_format).strftime('%Y-%m-%d %H:%M:%S')
-    except ValueError:
+    except (ValueError, TypeError):
         return None
 
 
-def migrate_to_mysql(csv_path, table_name, mysql_config):
+def get_date_converters(headers, predefined_fields):
+    """
+    Posición, función de conversión y formato de cada columna de fecha,
+    calculados una sola vez por carga en lugar de revisar el tipo en cada fila.
+    """
+    converters = []
+    for i, header in enumerate(headers):
+        field_type = predefined_fields.get(header)
+        if field_type == 'DATE':
+            # Ajusta el formato según sea necesario
+            converters.append((i, convert_date, '%Y-%m-%d'))
+        elif field_type in ['DATETIME', 'TIMESTAMP']:
+            # Ajusta el formato según sea necesario
+            converters.append((i, convert_datetime, '%m/%d/%Y %H:%M:%S'))
+    return converters
+
+
+def create_table(cursor, table_name, headers, target_table=None):
+    """
+    Crea la tabla con los campos predefinidos y su llave primaria. Con
+    `target_table` se crea con ese nombre usando el esquema de `table_name`.
+    """
+    target_table = target_table or table_name
+    predefined_fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+
+    if predefined_fields:
+        # Crear tabla con campos y tipos predefinidos
+        fields_definitions = [
+            f'{field} {predefined_fields[field]}'
+            for field in headers if field in predefined_fields
+        ]
+    else:
+        # Crear tabla con todos los campos como TEXT
+        fields_definitions = [f'{header} TEXT' for header in headers]
+
+    # Asegurarse de que haya al menos un campo en la definición
+    if not fields_definitions:
+        raise Exception(
+            f"No hay campos definidos para la tabla {table_name}.")
+
+    primary_key = PREDEFINED_FIELDS.get(
+        table_name, {}).get('primary_key')
+
+    if primary_key and primary_key in headers:
+        fields_definitions.append(f'PRIMARY KEY ({primary_key})')
+
+    create_table_query = f"CREATE TABLE {
+        target_table} ({', '.join(fields_definitions)})"
+    cursor.execute(create_table_query)
+
+    # Desactivar claves foráneas; los índices secundarios se crean al final
+    cursor.execute("SET foreign_key_checks = 0")
+
+
+def create_indexes(cursor, table_name, headers, target_table=None):
+    """
+    Crea los índices secundarios definidos en el esquema con un solo ALTER
+    TABLE, una vez cargados los datos.
+    """
+    target_table = target_table or table_name
+    indexes = PREDEFINED_FIELDS.get(table_name, {}).get('indexes', [])
+    clauses = [f"ADD INDEX idx_{table_name.lower()}_{index.lower()} ({index})"
+               for index in indexes if index in headers]
+    if clauses:
+        cursor.execute(f"ALTER TABLE {target_table} {', '.join(clauses)}")
+
+
+def get_staging_table(table_name):
+    return f"{table_name}__staging"
+
+
+def swap_staging_table(cursor, table_name):
+    """
+    Reemplaza la tabla por su copia de staging con un solo RENAME TABLE
+    atómico. La tabla anterior queda como <tabla>__old para poder volver atrás.
+    """
+    staging_table = get_staging_table(table_name)
+    old_table = f"{table_name}__old"
+    cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+    cursor.execute("SHOW TABLES LIKE %s", (table_name,))
+    if cursor.fetchone() is None:
+        cursor.execute(f"RENAME TABLE {staging_table} TO {table_name}")
+    else:
+        cursor.execute(
+            f"RENAME TABLE {table_name} TO {old_table}, {staging_table} TO {table_name}")
+
+
+def iter_csv_rows(reader, headers, predefined_fields):
+    """Genera las filas del CSV con las fechas convertidas y '' como NULL."""
+    converters = get_date_converters(headers, predefined_fields)
+    for row in reader:
+        if len(row) < len(headers):
+            row.extend([None] * (len(headers) - len(row)))
+
+        # Convertir fechas
+        for i, convert, value_format in converters:
+            row[i] = convert(row[i], value_format)
+
+        yield [None if value == '' else value for value in row]
+
+
+def insert_rows(cursor, insert_query, rows, batch_size=1000):
+    """
+    Inserta las filas con executemany en lotes; devuelve las filas insertadas.
+    Cada lote se suma a la etapa load de las métricas, que así informan el
+    avance de la carga mientras ocurre.
+    """
+    batch = []
+    rows_loaded = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            cursor.executemany(insert_query, batch)
+            metrics.add_rows('load', len(batch), len(batch))
+            rows_loaded += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(insert_query, batch)
+        metrics.add_rows('load', len(batch), len(batch))
+        rows_loaded += len(batch)
+    return rows_loaded
+
+
+def _tsv_value(value):
+    if value is None:
+        return '\\N'
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        text = (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+    return text
+
+
+def load_data_infile(cursor, table_name, headers, rows):
+    """
+    Escribe las filas (fechas ya normalizadas) en un TSV temporal con NULL
+    como \\N y las carga con LOAD DATA LOCAL INFILE. Con LOCAL, MySQL
+    convierte las llaves duplicadas y los valores inválidos en advertencias,
+    así que se devuelve (filas cargadas, problemas), donde problemas es
+    {'skipped': filas no cargadas, 'warnings': total, 'samples': primeras}.
+    """
+    rows_written = 0
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n', suffix='.tsv',
+                                     delete=False) as tsvfile:
+        tsv_path = tsvfile.name
+        for row in rows:
+            tsvfile.write('\t'.join([_tsv_value(value) for value in row]) + '\n')
+            rows_written += 1
+
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table_name} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(headers)})",
+            (tsv_path.replace('\\', '/'),))
+        rows_loaded = cursor.rowcount
+
+        cursor.execute("SHOW COUNT(*) WARNINGS")
+        warning_count = cursor.fetchone()[0]
+        samples = []
+        if warning_count:
+            cursor.execute("SHOW WARNINGS LIMIT 5")
+            for level, code, message in cursor.fetchall():
+                samples.append(f"{level} {code}: {message}")
+                print(f"{table_name}: {level} {code}: {message}")
+        print(f"LOAD DATA {table_name}: {rows_loaded} filas, {warning_count} advertencias")
+        metrics.add_rows('load', rows_written, rows_loaded)
+    finally:
+        os.remove(tsv_path)
+
+    return rows_loaded, {'skipped': max(0, rows_written - rows_loaded),
+                         'warnings': warning_count, 'samples': samples}
+
+
+def merge_load_issues(total, issues):
+    """Acumula los problemas de varias cargas con LOAD DATA."""
+    if total is None:
+        return issues
+    return {'skipped': total['skipped'] + issues['skipped'],
+            'warnings': total['warnings'] + issues['warnings'],
+            'samples': (total['samples'] + issues['samples'])[:5]}
+
+
+def describe_load_issues(issues):
+    """Texto para el mensaje de la tabla; vacío si la carga no tuvo problemas."""
+    if not issues or not (issues['skipped'] or issues['warnings']):
+        return ''
+    text = f" WARNING: {issues['skipped']} rows not loaded, {issues['warnings']} MySQL warnings"
+    if issues['samples']:
+        text += f" (first: {issues['samples'][0]})"
+    return text + '.'
+
+
+def migrate_to_mysql(csv_path, table_name, mysql_config, append=False, bulk=False,
+                     staging=False):
+    """
+    Carga el CSV en MySQL. Por defecto recrea la tabla; con `append` solo
+    inserta las filas en la tabla existente (carga incremental). Con `bulk`
+    las filas se cargan con LOAD DATA LOCAL INFILE en lugar de executemany.
+    Con `staging` la carga se hace en <tabla>__staging y se intercambia con la
+    tabla al terminar, sin dejarla vacía durante la carga. Los archivos
+    .parquet se leen con sus tipos en lugar de parsear el CSV.
+    """
+    if csv_path.lower().endswith('.parquet'):
+        if append:
+            raise Exception(f"La carga incremental de {table_name} requiere un CSV.")
+        return migrate_dataframes_to_mysql(
+            [read_parquet_table(csv_path, table_name)], table_name, mysql_config,
+            bulk=bulk, staging=staging)
+
     start_time = time.time()
+    staging = staging and not append
+    target_table = get_staging_table(table_name) if staging else table_name
     try:
-        conn = mysql.connector.connect(**mysql_config)
-        cursor = conn.cursor()
-        # Eliminar la tabla si ya existe
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-
-        with open(csv_path, 'r', encoding='latin-1') as csvfile:
-            reader = csv.reader(csvfile)
-            headers = next(reader)
-            # Convertir encabezados a mayúsculas
-            headers = [header.upper() for header in headers]
-
-           # Obteniendo los campos predefinidos y la llave primaria de PREDEFINED_FIELDS
-            predefined_table = PREDEFINED_FIELDS.get(table_name, {})
-            predefined_fields = predefined_table.get('fields', {})
-
-            if predefined_fields:
-                # Crear tabla con campos y tipos predefinidos
-                fields_definitions = [
-                    f'{field} {predefined_fields[field]}'
-                    for field in headers if field in predefined_fields
-                ]
+        # La conexión vuelve al pool al salir del bloque, aunque la carga falle
+        with pooled_connection(mysql_config, bulk=True) as conn:
+            cursor = conn.cursor()
+            if append:
+                cursor.execute("SHOW TABLES LIKE %s", (table_name,))
+                if cursor.fetchone() is None:
+                    raise Exception(
+                        f"La tabla {table_name} no existe para la carga incremental.")
             else:
-                # Crear tabla con todos los campos como TEXT
-                fields_definitions = [f'{header} TEXT' for header in headers]
-
-            # Asegurarse de que haya al menos un campo en la definición
-            if not fields_definitions:
-                raise Exception(
-                    f"No hay campos definidos para la tabla {table_name}.")
-
-            primary_key = PREDEFINED_FIELDS.get(
-                table_name, {}).get('primary_key')
-
-            if primary_key and primary_key in headers:
-                fields_definitions.append(f'PRIMARY KEY ({primary_key})')
-
-            create_table_query = f"CREATE TABLE {
-                table_name} ({', '.join(fields_definitions)})"
-            cursor.execute(create_table_query)
-
-            # Desactivar índices y claves foráneas
-            cursor.execute("SET foreign_key_checks = 0")
-            cursor.execute(f"ALTER TABLE {table_name} DISABLE KEYS")
-            # Crear índices según las uniones y filtros comunes
-            indices = {
-                'SC0011': ['cod_ser', 'cod_emp', 'cod_pac', 'num_doc', 'fec_doc', 'tot_doc', 'nom_pac'],
-                'SC0006': ['cod_ser'],
-                'SC0002': ['cod_cia', 'nom_cia'],
-                'SC0003': ['cod_emp'],
-                'SC0004': ['cod_pac'],
-                'SC0033': ['num_doc'],
-                'SC0017': ['num_doc', 'num_fac'],
-                'SC0022': ['num_fac']
-            }
-
-            if table_name in indices:
-                for index in indices[table_name]:
-                    cursor.execute(f"CREATE INDEX idx_{table_name.lower()}_{
-                                   index} ON {table_name} ({index})")
-
-            # Preparar consulta de inserción
-            insert_query = f"INSERT INTO {table_name} ({', '.join(headers)}) VALUES ({
-                ', '.join(['%s'] * len(headers))})"
-            batch_size = 1000
-            batch = []
+                # Eliminar la tabla si ya existe
+                cursor.execute(f"DROP TABLE IF EXISTS {target_table}")
+
+            with open(csv_path, 'r', encoding='latin-1') as csvfile:
+                reader = csv.reader(csvfile)
+                headers = next(reader)
+                # Convertir encabezados a mayúsculas
+                headers = [header.upper() for header in headers]
 
-            for row in reader:
-                if len(row) < len(headers):
-                    row.extend([None] * (len(headers) - len(row)))
-
-                # Convertir fechas
-                for i, header in enumerate(headers):
-                    if header in predefined_fields:
-                        field_type = predefined_fields[header]
-                        if field_type == 'DATE':
-                            # Ajusta el formato según sea necesario
-                            row[i] = convert_date(row[i], '%Y-%m-%d')
-                        elif field_type in ['DATETIME', 'TIMESTAMP']:
-                            # Ajusta el formato según sea necesario
-                            row[i] = convert_datetime(
-                                row[i], '%m/%d/%Y %H:%M:%S')
-
-                batch.append([None if value == '' else value for value in row])
-
-                if len(batch) == batch_size:
-                    cursor.executemany(insert_query, batch)
-                    batch = []
-
-            if batch:
-                cursor.executemany(insert_query, batch)
-
-            # Reactivar índices y claves foráneas
-            cursor.execute(f"ALTER TABLE {table_name} ENABLE KEYS")
+               # Obteniendo los campos predefinidos y la llave primaria de PREDEFINED_FIELDS
+                predefined_table = PREDEFINED_FIELDS.get(table_name, {})
+                predefined_fields = predefined_table.get('fields', {})
+
+                if not append:
+                    create_table(cursor, table_name, headers, target_table)
+
+                rows = iter_csv_rows(reader, headers, predefined_fields)
+                issues = None
+                if bulk:
+                    rows_loaded, issues = load_data_infile(cursor, target_table, headers, rows)
+                else:
+                    # Preparar consulta de inserción
+                    insert_query = f"INSERT INTO {target_table} ({', '.join(headers)}) VALUES ({
+                        ', '.join(['%s'] * len(headers))})"
+                    rows_loaded = insert_rows(cursor, insert_query, rows)
+
+                # Crear índices y reactivar claves foráneas
+                if not append:
+                    create_indexes(cursor, table_name, headers, target_table)
+                cursor.execute("SET foreign_key_checks = 1")
+                conn.commit()
+
+                if staging:
+                    swap_staging_table(cursor, table_name)
+
+                cursor.close()
+
+                end_time = time.time()
+                duration = end_time - start_time
+                print(f"Tiempo total de migración: {duration:.2f} segundos")
+                if append:
+                    return f"Table {table_name}: {rows_loaded} rows appended.{describe_load_issues(issues)}"
+                if bulk:
+                    return (f"Table {table_name} migrated successfully ({rows_loaded} rows bulk-loaded)."
+                            f"{describe_load_issues(issues)}")
+                return f"Table {table_name} migrated successfully."
+
+    except mysql.connector.Error as e:
+        raise Exception(f"Error migrating table {table_name}: {e}")
+
+
+def read_parquet_table(parquet_path, table_name):
+    """Lee del Parquet solo las columnas del esquema de la tabla."""
+    # pyarrow solo hace falta con OUTPUT_FORMAT=parquet
+    import pyarrow.parquet as pq
+
+    predefined_fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    names = pq.read_schema(parquet_path).names
+    columns = [name for name in names if name.upper() in predefined_fields]
+    return pd.read_parquet(parquet_path, columns=columns or None)
+
+
+def apply_schema_types(df, table_name):
+    """
+    Lleva cada columna numérica o de fecha al tipo de su campo en el esquema y
+    verifica que los valores quepan en la columna MySQL: el largo de VARCHAR,
+    valores enteros en INT y los dígitos enteros de DECIMAL. Una columna que
+    no cumple detiene la carga de la tabla, en lugar de que MySQL trunque o
+    redondee los valores.
+    """
+    predefined_fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    for column in df.columns:
+        match = FIELD_TYPE_PATTERN.match(predefined_fields.get(column.upper(), ''))
+        if not match:
+            continue
+        base_type, size, decimals = match.group(1).upper(), match.group(2), int(match.group(3) or 0)
+        values = df[column]
+        try:
+            if base_type in NUMERIC_TYPES and not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values)
+            elif base_type in DATETIME_TYPES and not pd.api.types.is_datetime64_any_dtype(values):
+                values = pd.to_datetime(values)
+        except (ValueError, TypeError) as e:
+            raise Exception(f"Column {column} of {table_name} does not match its type {base_type}: {e}")
+
+        present = values.dropna()
+        invalid = None
+        if base_type == 'VARCHAR' and size:
+            invalid = present[present.astype(str).str.len() > int(size)]
+        elif base_type == 'INT' and pd.api.types.is_float_dtype(present):
+            invalid = present[present != present.round()]
+        elif base_type == 'DECIMAL' and size:
+            invalid = present[present.abs() >= 10 ** (int(size) - decimals)]
+        if invalid is not None and len(invalid):
+            raise Exception(f"Column {column} of {table_name}: {len(invalid)} values do not fit "
+                            f"{predefined_fields[column.upper()]} (first: {str(invalid.iloc[0])[:50]})")
+        df[column] = values
+    return df
+
+
+def dataframe_to_rows(df, table_name):
+    """Convierte un DataFrame transformado en filas listas para el cursor."""
+    predefined_fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if predefined_fields.get(column.upper()) == 'DATE':
+                values = values.dt.strftime('%Y-%m-%d')
+            else:
+                values = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+        values = values.astype(object)
+        columns[column] = values.where(values.notna() & (values != ''), None)
+    return pd.DataFrame(columns).itertuples(index=False, name=None)
+
+
+def migrate_dataframes_to_mysql(frames, table_name, mysql_config, batch_size=1000, bulk=False,
+                                staging=False):
+    """
+    Recrea la tabla y carga los DataFrames de `frames` a medida que llegan,
+    sin pasar por archivos intermedios. La tabla se crea con las columnas del
+    primer DataFrame. Con `bulk` cada lote se carga con LOAD DATA LOCAL INFILE
+    y con `staging` la carga pasa por <tabla>__staging, como en migrate_to_mysql.
+    """
+    start_time = time.time()
+    target_table = get_staging_table(table_name) if staging else table_name
+    try:
+        # La conexión vuelve al pool al salir del bloque, aunque la carga falle
+        with pooled_connection(mysql_config, bulk=True) as conn:
+            cursor = conn.cursor()
+            # Eliminar la tabla si ya existe
+            cursor.execute(f"DROP TABLE IF EXISTS {target_table}")
+
+            insert_query = None
+            rows_loaded = 0
+            issues = None
+            for df in frames:
+                if insert_query is None:
+                    headers = [column.upper() for column in df.columns]
+                    create_table(cursor, table_name, headers, target_table)
+                    insert_query = (
+                        f"INSERT INTO {target_table} ({', '.join(headers)}) "
+                        f"VALUES ({', '.join(['%s'] * len(headers))})")
+
+                rows = dataframe_to_rows(apply_schema_types(df, table_name), table_name)
+                if bulk:
+                    batch_rows, batch_issues = load_data_infile(cursor, target_table, headers, rows)
+                    rows_loaded += batch_rows
+                    issues = merge_load_issues(issues, batch_issues)
+                else:
+                    rows_loaded += insert_rows(cursor, insert_query, rows, batch_size)
+
+            if insert_query is None:
+                raise Exception(f"No se recibieron datos para la tabla {table_name}.")
+
+            # Crear índices y reactivar claves foráneas
+            create_indexes(cursor, table_name, headers, target_table)
             cursor.execute("SET foreign_key_checks = 1")
+            conn.commit()
+
+            if staging:
+                swap_staging_table(cursor, table_name)
+
+            cursor.close()
+
+            duration = time.time() - start_time
+            print(f"Tiempo total de migración: {duration:.2f} segundos")
+            return (f"Table {table_name} migrated successfully ({rows_loaded} rows streamed)."
+                    f"{describe_load_issues(issues)}")
+
+    except mysql.connector.Error as e:
+        raise Exception(f"Error migrating table {table_name}: {e}")
+
+
+def apply_changes_to_mysql(changed_df, deleted_keys, table_name, mysql_config):
+    """
+    Aplica sobre la tabla existente solo los cambios detectados: inserta o
+    actualiza las filas de `changed_df` y elimina las llaves de `deleted_keys`.
+    """
+    start_time = time.time()
+    primary_key = PREDEFINED_FIELDS.get(table_name, {}).get('primary_key')
+    if not primary_key:
+        raise Exception(f"La tabla {table_name} no tiene llave primaria definida.")
+
+    try:
+        # La conexión vuelve al pool al salir del bloque, aunque la carga falle
+        with pooled_connection(mysql_config, bulk=True) as conn:
+            cursor = conn.cursor()
+            batch_size = 1000
+
+            if len(changed_df):
+                headers = [column.upper() for column in changed_df.columns]
+                updates = [f"{header} = VALUES({header})"
+                           for header in headers if header != primary_key]
+                upsert_query = (
+                    f"INSERT INTO {table_name} ({', '.join(headers)}) "
+                    f"VALUES ({', '.join(['%s'] * len(headers))}) "
+                    f"ON DUPLICATE KEY UPDATE {', '.join(updates or [f'{primary_key} = {primary_key}'])}")
+                changed_df = apply_schema_types(changed_df, table_name)
+                insert_rows(cursor, upsert_query, dataframe_to_rows(changed_df, table_name), batch_size)
+
+            for start in range(0, len(deleted_keys), batch_size):
+                keys = deleted_keys[start:start + batch_size]
+                cursor.execute(
+                    f"DELETE FROM {table_name} WHERE {primary_key} IN ({', '.join(['%s'] * len(keys))})",
+                    keys)
 
+            conn.commit()
             cursor.close()
-            conn.close()
 
-            end_time = time.time()
-            duration = end_time - start_time
+            duration = time.time() - start_time
             print(f"Tiempo total de migración: {duration:.2f} segundos")
-            return f"Table {table_name} migrated successfully."
+            return (f"Table {table_name}: {len(changed_df)} rows upserted, "
+                    f"{len(deleted_keys)} rows deleted.")
 
     except mysql.connector.Error as e:
         raise Exception(f"Error migrating table {table_name}: {e}")
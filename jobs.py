@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from functions import run_migration_logic
+from metrics import load_history
+
+
+# Migraciones que se ejecutan a la vez; las demás esperan en la cola
+JOB_WORKERS = 1
+
+# Trabajos terminados que se conservan para consultar su estado
+FINISHED_JOBS = 50
+
+
+def _dbf_size(path_databases, table):
+    try:
+        return os.path.getsize(os.path.join(path_databases, f"{table}.DBF"))
+    except OSError:
+        return 0
+
+
+def _history_rate(states):
+    """
+    Segundos por byte de DBF según la última corrida guardada de las mismas
+    tablas, para estimar el tiempo restante antes de que termine alguna.
+    """
+    history = load_history()
+    if not history:
+        return None
+    seconds = {t['table']: t['seconds'] for t in history[-1].get('tables', [])
+               if not t.get('error')}
+    measured = [(seconds[table], state['bytes']) for table, state in states.items()
+                if table in seconds and state['bytes']]
+    total_bytes = sum(size for _, size in measured)
+    return sum(elapsed for elapsed, _ in measured) / total_bytes if total_bytes else None
+
+
+def _table_rows(result):
+    """Filas cargadas (o, si no llegó a cargar, las últimas procesadas) de la tabla."""
+    stages = result.get('stages', {})
+    for stage in ('load', 'write', 'transform', 'decode'):
+        if stage in stages:
+            return stages[stage]['rows_out']
+    return 0
+
+
+class MigrationJobs:
+    """
+    Ejecuta las migraciones en segundo plano y guarda el avance de cada una
+    por tabla. Una migración pedida mientras otra igual está en curso o en
+    cola no se duplica: se devuelve el trabajo existente.
+    """
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='migration')
+        self.jobs = {}
+        # Trabajo activo por parámetros de la migración
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def submit(self, path_databases, output_folder, tables, **options):
+        """Encola la migración y devuelve (id del trabajo, si es un trabajo nuevo)."""
+        key = (path_databases, output_folder, tuple(tables), tuple(sorted(options.items())))
+        with self.lock:
+            job_id = self.active.get(key)
+            if job_id is not None:
+                return job_id, False
+
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'tables': {table: {'status': 'queued', 'rows': 0, 'seconds': None, 'error': None,
+                                   'bytes': _dbf_size(path_databases, table)}
+                           for table in tables},
+                'messages': [],
+                'error': None,
+            }
+            self.active[key] = job_id
+            self._discard_finished()
+
+        self.executor.submit(self._run, job_id, key, path_databases, output_folder, tables, options)
+        return job_id, True
+
+    def _discard_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job['status'] in ('done', 'error')]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _progress(self, job_id, table, status, result):
+        with self.lock:
+            state = self.jobs[job_id]['tables'][table]
+            state['status'] = status
+            if status == 'running':
+                if result is None:
+                    state['started_at'] = time.time()
+                else:
+                    # Métricas parciales de la tabla en curso
+                    state['rows'] = _table_rows(result)
+            elif result:
+                state['rows'] = _table_rows(result)
+                state['seconds'] = result.get('seconds')
+                state['error'] = result.get('error')
+
+    def _run(self, job_id, key, path_databases, output_folder, tables, options):
+        with self.lock:
+            self.jobs[job_id]['status'] = 'running'
+            self.jobs[job_id]['started_at'] = time.time()
+        try:
+            messages = run_migration_logic(
+                path_databases, output_folder, tables,
+                progress=lambda table, status, result: self._progress(job_id, table, status, result),
+                **options)
+            status, error = 'done', None
+        except Exception as e:
+            messages, status, error = [], 'error', str(e)
+        with self.lock:
+            job = self.jobs[job_id]
+            job['messages'] = messages
+            job['status'] = status
+            job['error'] = error
+            job['finished_at'] = time.time()
+            del self.active[key]
+
+    def get(self, job_id):
+        """Estado del trabajo con filas procesadas y tiempo restante estimado, o None."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job, tables={table: dict(state) for table, state in job['tables'].items()})
+
+        states = job['tables']
+        tables = states.values()
+        job['rows_processed'] = sum(state['rows'] for state in tables)
+        job['tables_done'] = sum(state['status'] in ('done', 'error') for state in tables)
+        job['eta_seconds'] = None
+        if job['status'] == 'running':
+            # El tiempo restante se estima por el tamaño de los DBF que faltan, al
+            # ritmo (segundos por byte) de las tablas ya terminadas o, si todavía
+            # no terminó ninguna, al de la corrida anterior
+            finished = [state for state in tables
+                        if state['status'] in ('done', 'error') and state['seconds'] is not None]
+            done_bytes = sum(state['bytes'] for state in finished)
+            if done_bytes:
+                rate = sum(state['seconds'] for state in finished) / done_bytes
+            else:
+                rate = _history_rate(states)
+            if rate is not None:
+                pending_bytes = sum(state['bytes'] for state in tables
+                                    if state['status'] not in ('done', 'error'))
+                running_seconds = sum(time.time() - state['started_at'] for state in tables
+                                      if state['status'] == 'running')
+                job['eta_seconds'] = round(max(0.0, pending_bytes * rate - running_seconds), 1)
+        elif job['status'] == 'done':
+            job['eta_seconds'] = 0
+        return job
+
+    def list(self):
+        """Resumen de los trabajos, del más reciente al más antiguo."""
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda job: job['created_at'], reverse=True)
+            return [{'id': job['id'], 'status': job['status'], 'created_at': job['created_at'],
+                     'finished_at': job['finished_at']} for job in jobs]
@@ -6,9 +6,11 @@ from dotenv import load_dotenv
 import uvicorn
 import time
 import sys
+from multiprocessing import freeze_support
 
-from convert_dbf_csv import convert_dbf_to_csv
+from functions import get_table_file, run_migration_logic
 from import_csv_mysql import migrate_to_mysql
+from mysql_pool import get_mysql_config
 
 
 class TextRedirector:
@@ -137,34 +139,15 @@ class VFPApp:
             self.is_server_running = False
             self.toggle_server_button.config(text="Start Server")
 
-    def _convert_tables(self, path_databases, output_folder, tables):
-        """Convierte las tablas DBF a CSV."""
-        os.makedirs(output_folder, exist_ok=True)
-        for table in tables:
-            dbf_path = os.path.join(path_databases, f"{table}.DBF")
-            csv_path = os.path.join(output_folder, f"{table}.csv")
-            try:
-                convert_dbf_to_csv(dbf_path, csv_path)
-                self.log(f"Successfully converted {table}.DBF to {table}.csv")
-            except Exception as e:
-                self.log(f"Error converting {table}: {e}")
-
     def _migrate_tables_to_mysql(self, output_folder, tables):
         """Migra las tablas CSV a MySQL."""
-        mysql_config = {
-            'host': os.getenv('MYSQL_HOST', 'localhost'),
-            'user': os.getenv('MYSQL_USER', 'root'),
-            'password': os.getenv('MYSQL_PASS', ''),
-            'database': os.getenv('MYSQL_DB', 'db_sisclin'),
-            'allow_local_infile': True,
-            'charset': 'utf8mb4'
-        }
+        mysql_config = get_mysql_config()
 
         for table in tables:
-            csv_path = os.path.join(output_folder, f"{table}.csv")
+            table_path = get_table_file(output_folder, table)
             try:
                 migration_message = migrate_to_mysql(
-                    csv_path, table, mysql_config)
+                    table_path, table, mysql_config)
                 self.log(migration_message)
             except Exception as e:
                 self.log(f"Error migrating {table}: {e}")
@@ -188,14 +171,17 @@ class VFPApp:
         output_folder = self.output_folder_var.get()
         tables = self.tables_var.get().split(',')
 
-        self._convert_tables(path_databases, output_folder, tables)
-        self._migrate_tables_to_mysql(output_folder, tables)
+        # Las tablas se procesan en paralelo según MIGRATION_WORKERS
+        run_migration_logic(path_databases, output_folder, tables, logger=self.log)
 
         elapsed_time = time.time() - start_time
         self.log(f"Migration completed in {elapsed_time:.2f} seconds.")
 
 
 if __name__ == "__main__":
+    # En el ejecutable de PyInstaller los procesos de MIGRATION_WORKERS y
+    # DECODE_WORKERS deben ejecutar su tarea en lugar de abrir otra ventana
+    freeze_support()
     load_dotenv(".env")
     print("Variables de entorno cargadas:")
     with open(".env") as f:
@@ -9,6 +9,7 @@ import sys
 
 from convert_dbf_xlxs import convert_dbf_to_xlsx
 from import_xlsx_mysql import migrate_xlsx_to_mysql
+from mysql_pool import get_mysql_config
 
 
 class TextRedirector:
@@ -151,14 +152,7 @@ class VFPApp:
 
     def _migrate_tables_to_mysql(self, output_folder, tables):
         """Migra las tablas CSV a MySQL."""
-        mysql_config = {
-            'host': os.getenv('MYSQL_HOST', 'localhost'),
-            'user': os.getenv('MYSQL_USER', 'root'),
-            'password': os.getenv('MYSQL_PASS', ''),
-            'database': os.getenv('MYSQL_DB', 'db_sisclin'),
-            'allow_local_infile': True,
-            'charset': 'utf8mb4'
-        }
+        mysql_config = get_mysql_config()
 
         for table in tables:
             xlsx_path = os.path.join(output_folder, f"{table}.xlsx")
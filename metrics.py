@@ -0,0 +1,221 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+# Corridas que se conservan en el historial
+HISTORY_RUNS = 50
+
+# Segundos mínimos entre dos avisos de avance de una tabla
+PROGRESS_INTERVAL = 1.0
+
+# Métricas de la tabla que se está migrando en este proceso
+_current = None
+
+
+def peak_rss_bytes():
+    """Pico de memoria residente del proceso actual, en bytes."""
+    try:
+        import resource
+    except ImportError:
+        # Windows: PeakWorkingSetSize de GetProcessMemoryInfo
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB y macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class TableMetrics:
+    """
+    Tiempos por etapa, filas de entrada y salida, filas descartadas por cada
+    filtro y bytes leídos del DBF de una tabla. Se arma en el proceso que
+    migra la tabla y se devuelve como dict. `on_change`, si se indica, recibe
+    ese dict cada vez que se suman filas, como mucho una vez por
+    PROGRESS_INTERVAL segundos.
+    """
+
+    def __init__(self, table, on_change=None):
+        self.table = table
+        self.stages = {}
+        self.dropped = {}
+        self.bytes_read = 0
+        self.on_change = on_change
+        self._notified_at = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Mide la etapa; los tiempos de una etapa repetida (por lotes) se suman."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0})
+            stage['seconds'] += time.perf_counter() - start
+            stage['peak_rss_bytes'] = peak_rss_bytes()
+
+    def add_rows(self, name, rows_in=0, rows_out=0):
+        stage = self.stages.setdefault(name, {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0})
+        stage['rows_in'] += rows_in
+        stage['rows_out'] += rows_out
+        if self.on_change is not None and time.monotonic() - self._notified_at >= PROGRESS_INTERVAL:
+            self._notified_at = time.monotonic()
+            self.on_change(self.to_dict())
+
+    def to_dict(self):
+        return {
+            'table': self.table,
+            'stages': {name: dict(stage) for name, stage in self.stages.items()},
+            'dropped': self.dropped,
+            'bytes_read': self.bytes_read,
+            'peak_rss_bytes': peak_rss_bytes(),
+        }
+
+
+@contextmanager
+def collect_table_metrics(table, on_change=None):
+    """Activa las métricas de `table` para las funciones del pipeline de este proceso."""
+    global _current
+    previous, _current = _current, TableMetrics(table, on_change)
+    try:
+        yield _current
+    finally:
+        _current = previous
+
+
+@contextmanager
+def stage(name):
+    """Mide una etapa de la tabla activa; sin métricas activas no hace nada."""
+    if _current is None:
+        yield
+        return
+    with _current.stage(name):
+        yield
+
+
+def add_rows(name, rows_in=0, rows_out=0):
+    if _current is not None:
+        _current.add_rows(name, rows_in, rows_out)
+
+
+def add_dropped(filter_name, rows):
+    if _current is not None and rows:
+        _current.dropped[filter_name] = _current.dropped.get(filter_name, 0) + int(rows)
+
+
+def add_bytes_read(size):
+    if _current is not None:
+        _current.bytes_read += int(size)
+
+
+def get_history_path():
+    return os.getenv('METRICS_HISTORY_PATH', 'metrics_history.json')
+
+
+def load_history():
+    """Corridas recientes, de la más antigua a la más nueva."""
+    try:
+        with open(get_history_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def record_run(run):
+    """Agrega la corrida al historial y conserva solo las últimas HISTORY_RUNS."""
+    history = (load_history() + [run])[-HISTORY_RUNS:]
+    history_path = get_history_path()
+    directory = os.path.dirname(history_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = history_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    os.replace(temp_path, history_path)
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _format_metric(lines, name, help_text, samples, metric_type='gauge'):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+
+def format_prometheus(history):
+    """Métricas de la última corrida en el formato de texto de Prometheus."""
+    lines = []
+
+    def metric(name, help_text, samples):
+        _format_metric(lines, name, help_text, samples)
+
+    if not history:
+        return ''
+    run = history[-1]
+    tables = run.get('tables', [])
+
+    metric('sisclin_last_run_timestamp_seconds', 'Inicio de la última corrida.',
+           [('', run['started_at'])])
+    metric('sisclin_last_run_duration_seconds', 'Duración de la última corrida.',
+           [('', round(run['duration_seconds'], 3))])
+    metric('sisclin_table_duration_seconds', 'Duración de la migración de cada tabla.',
+           [(_labels(table=t['table']), round(t['seconds'], 3)) for t in tables])
+    metric('sisclin_table_failed', '1 si la migración de la tabla terminó con error.',
+           [(_labels(table=t['table']), int(bool(t['error']))) for t in tables])
+    metric('sisclin_stage_duration_seconds', 'Duración de cada etapa por tabla.',
+           [(_labels(table=t['table'], stage=name), round(s['seconds'], 3))
+            for t in tables for name, s in t['stages'].items()])
+    metric('sisclin_stage_rows_in', 'Filas que recibe cada etapa por tabla.',
+           [(_labels(table=t['table'], stage=name), s['rows_in'])
+            for t in tables for name, s in t['stages'].items()])
+    metric('sisclin_stage_rows_out', 'Filas que entrega cada etapa por tabla.',
+           [(_labels(table=t['table'], stage=name), s['rows_out'])
+            for t in tables for name, s in t['stages'].items()])
+    metric('sisclin_rows_dropped', 'Filas descartadas por cada filtro por tabla.',
+           [(_labels(table=t['table'], filter=name), rows)
+            for t in tables for name, rows in t['dropped'].items()])
+    metric('sisclin_bytes_read', 'Bytes de registros leídos del DBF por tabla (sin memos del FPT).',
+           [(_labels(table=t['table']), t['bytes_read']) for t in tables])
+    metric('sisclin_peak_rss_bytes', 'Pico de memoria del proceso que migró la tabla.',
+           [(_labels(table=t['table']), t['peak_rss_bytes']) for t in tables])
+    return '\n'.join(lines) + '\n'
+
+
+def format_query_cache(stats):
+    """Contadores de la caché de resultados de /execute_query para Prometheus."""
+    lines = []
+    _format_metric(lines, 'sisclin_query_cache_hits_total', 'Consultas servidas desde la caché.',
+                   [('', stats['hits'])], 'counter')
+    _format_metric(lines, 'sisclin_query_cache_misses_total', 'Consultas que no estaban en la caché.',
+                   [('', stats['misses'])], 'counter')
+    _format_metric(lines, 'sisclin_query_cache_evictions_total',
+                   'Resultados descartados para respetar el límite de tamaño.',
+                   [('', stats['evictions'])], 'counter')
+    _format_metric(lines, 'sisclin_query_cache_entries', 'Resultados guardados en la caché.',
+                   [('', stats['entries'])])
+    _format_metric(lines, 'sisclin_query_cache_bytes', 'Tamaño aproximado de la caché.',
+                   [('', stats['bytes'])])
+    _format_metric(lines, 'sisclin_query_cache_max_bytes', 'Límite de tamaño de la caché (QUERY_CACHE_MB).',
+                   [('', stats['max_bytes'])])
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,115 @@
+import os
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+
+
+# Conexiones por pool; cada proceso trabajador arma su propio pool
+POOL_SIZE = 4
+
+# Espera para obtener una conexión de un pool agotado: intentos y pausa inicial
+POOL_RETRIES = 8
+POOL_RETRY_DELAY = 0.25
+
+# Ajustes de sesión para las cargas masivas. El pool restablece la sesión al
+# devolver la conexión, así que no afectan a otros usos.
+BULK_SESSION_SETTINGS = [
+    "SET SESSION unique_checks = 0",
+    "SET SESSION foreign_key_checks = 0",
+]
+
+_pools = {}
+_pools_pid = None
+
+
+def get_mysql_config():
+    """Configuración de MySQL a partir de las variables de entorno."""
+    return {
+        'host': os.getenv('MYSQL_HOST', 'localhost'),
+        'user': os.getenv('MYSQL_USER', 'root'),
+        'password': os.getenv('MYSQL_PASS', ''),
+        'database': os.getenv('MYSQL_DB', 'db_sisclin'),
+        'allow_local_infile': True,
+        'charset': 'utf8mb4'
+    }
+
+
+def get_pool(mysql_config=None):
+    """
+    Devuelve el pool de conexiones de este proceso para la configuración,
+    creándolo la primera vez. Los pools heredados de otro proceso (fork) se
+    descartan.
+    """
+    global _pools_pid
+    if _pools_pid != os.getpid():
+        _pools.clear()
+        _pools_pid = os.getpid()
+
+    mysql_config = mysql_config or get_mysql_config()
+    key = tuple(sorted((name, str(value)) for name, value in mysql_config.items()))
+    pool = _pools.get(key)
+    if pool is None:
+        # Al menos una conexión por tabla que se migra en paralelo
+        pool_size = max(int(os.getenv('MYSQL_POOL_SIZE', POOL_SIZE)),
+                        int(os.getenv('MIGRATION_WORKERS', '1')))
+        pool = pooling.MySQLConnectionPool(
+            pool_name=f"sisclin_{os.getpid()}_{len(_pools)}",
+            pool_size=min(pool_size, pooling.CNX_POOL_MAXSIZE),
+            pool_reset_session=True,
+            **mysql_config)
+        _pools[key] = pool
+    return pool
+
+
+def apply_bulk_session(conn):
+    """Aplica los ajustes de sesión para cargas masivas."""
+    cursor = conn.cursor()
+    for statement in BULK_SESSION_SETTINGS:
+        cursor.execute(statement)
+    # Omitir el binlog requiere privilegios; solo se intenta si se pide
+    if os.getenv('MYSQL_SKIP_BINLOG', '0') == '1':
+        try:
+            cursor.execute("SET SESSION sql_log_bin = 0")
+        except mysql.connector.Error as e:
+            print(f"No se pudo desactivar sql_log_bin: {e}")
+    cursor.close()
+
+
+def get_connection(mysql_config=None, bulk=False):
+    """
+    Toma una conexión del pool y verifica que siga viva, reconectando si el
+    servidor la cerró. Si el pool está agotado espera a que se libere una
+    conexión, con pausas crecientes. Con `bulk` se aplican los ajustes de
+    carga masiva.
+    """
+    pool = get_pool(mysql_config)
+    delay = POOL_RETRY_DELAY
+    for attempt in range(POOL_RETRIES):
+        try:
+            conn = pool.get_connection()
+            break
+        except mysql.connector.errors.PoolError:
+            if attempt == POOL_RETRIES - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+    try:
+        conn.ping(reconnect=True, attempts=3, delay=1)
+        if bulk:
+            apply_bulk_session(conn)
+    except mysql.connector.Error:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def pooled_connection(mysql_config=None, bulk=False):
+    """Conexión del pool que se devuelve al salir del bloque."""
+    conn = get_connection(mysql_config, bulk)
+    try:
+        yield conn
+    finally:
+        conn.close()
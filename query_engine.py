@@ -0,0 +1,391 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from dbf_reader import DBFReader, VFP_VERSIONS
+from fpt_reader import find_memo_file
+
+
+# Tablas referenciadas en la consulta (FROM t, JOIN t, FROM a, b)
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*(?:\s*,\s*[A-Za-z_]\w*)*)', re.IGNORECASE)
+
+# `SELECT *`, `DISTINCT *`, `, *` o `t.*` requieren todas las columnas (COUNT(*) no)
+STAR_PATTERN = re.compile(r'(?:\bSELECT|\bDISTINCT|,|\.)\s*\*', re.IGNORECASE)
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_]\w*')
+
+# Palabras que siguen a FROM/JOIN en una lista de tablas y no son tablas
+SQL_KEYWORDS = {'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'AS', 'ON', 'LEFT', 'RIGHT', 'INNER',
+                'OUTER', 'CROSS', 'JOIN', 'UNION', 'HAVING', 'SELECT'}
+
+# Filas por INSERT al registrar una tabla en SQLite
+LOAD_CHUNK_ROWS = 50000
+
+# Filas que se leen de SQLite por vez al transmitir un resultado
+STREAM_BATCH_ROWS = 1000
+
+# Segundos que una consulta espera a que el motor se libere (QUERY_LOCK_TIMEOUT)
+QUERY_LOCK_TIMEOUT = 30
+
+# Tamaño máximo de la caché de resultados (QUERY_CACHE_MB)
+QUERY_CACHE_MB = 64
+
+# Literales de texto e identificadores entre comillas, que no se normalizan
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+# Piezas de la consulta que importan para paginarla: texto entre comillas,
+# comentarios, paréntesis y palabras
+SQL_TOKEN_PATTERN = re.compile(
+    r"""(?P<quoted>'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])"""
+    r"|(?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))"
+    r"|(?P<open>\()|(?P<close>\))|(?P<word>[A-Za-z_]\w*)",
+    re.DOTALL)
+
+
+def find_dbf_file(data_source, table_name):
+    """Ruta del DBF de la tabla en la carpeta de datos, sin distinguir mayúsculas."""
+    for extension in ('.DBF', '.dbf', '.Dbf'):
+        path = os.path.join(data_source, table_name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def file_fingerprint(dbf_path):
+    """
+    Identifica la versión del DBF (y de su .FPT) por fecha de modificación,
+    tamaño y cantidad de registros de la cabecera.
+    """
+    stat = os.stat(dbf_path)
+    fingerprint = (stat.st_mtime_ns, stat.st_size, DBFReader(dbf_path).record_count)
+    memo_path = find_memo_file(dbf_path)
+    if memo_path:
+        memo_stat = os.stat(memo_path)
+        fingerprint += (memo_stat.st_mtime_ns, memo_stat.st_size)
+    return fingerprint
+
+
+def normalize_query(query):
+    """
+    Texto de la consulta para la llave de la caché: espacios colapsados,
+    mayúsculas y sin el punto y coma final, salvo dentro de las comillas.
+    """
+    parts = QUOTED_PATTERN.split(query.strip().rstrip(';').strip())
+    for position in range(0, len(parts), 2):
+        parts[position] = re.sub(r'\s+', ' ', parts[position]).upper()
+    return ''.join(parts).strip()
+
+
+class QueryError(Exception):
+    """Consulta que no se puede atender por un error de quien la envía."""
+
+
+def _strip_comments(query, blank_quoted=False):
+    """
+    Consulta sin comentarios (con `blank_quoted`, además sin el texto entre
+    comillas) y si tiene un LIMIT propio fuera de paréntesis.
+    """
+    parts = []
+    depth = 0
+    has_limit = False
+    position = 0
+    for match in SQL_TOKEN_PATTERN.finditer(query):
+        parts.append(query[position:match.start()])
+        position = match.end()
+        if match.lastgroup == 'comment':
+            parts.append(' ')
+            continue
+        if match.lastgroup == 'quoted' and blank_quoted:
+            parts.append("''")
+            continue
+        if match.lastgroup == 'open':
+            depth += 1
+        elif match.lastgroup == 'close':
+            depth -= 1
+        elif match.lastgroup == 'word' and depth == 0 and match.group().upper() == 'LIMIT':
+            has_limit = True
+        parts.append(match.group())
+    parts.append(query[position:])
+    return ''.join(parts), has_limit
+
+
+def paginate_query(query, limit=None, offset=0):
+    """
+    Agrega LIMIT/OFFSET a la consulta para que SQLite deje de producir filas
+    al completar la página. Devuelve (consulta, parámetros). Solo una consulta
+    que ya tiene su propio LIMIT se envuelve en un SELECT externo.
+    """
+    if limit is None and not offset:
+        return query, ()
+    sql, has_limit = _strip_comments(query)
+    sql = sql.strip().rstrip(';').strip()
+    # LIMIT -1 es "sin límite" en SQLite
+    params = (-1 if limit is None else limit, offset)
+    if has_limit:
+        return f"SELECT * FROM (\n{sql}\n) LIMIT ? OFFSET ?", params
+    return f"{sql}\nLIMIT ? OFFSET ?", params
+
+
+def _result_size(columns, rows):
+    """Tamaño aproximado en bytes de un resultado."""
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class ResultCache:
+    """
+    Caché LRU de resultados limitada por tamaño en bytes. Los resultados más
+    grandes que el límite no se guardan.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, result):
+        size = _result_size(*result)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous[1]
+        self._entries[key] = (result, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+        }
+
+
+def _read_only_authorizer(action, *args):
+    # Durante las consultas de los usuarios solo se permite leer
+    if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                  sqlite3.SQLITE_RECURSIVE):
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+class QueryEngine:
+    """
+    Ejecuta consultas SELECT sobre las tablas DBF de `data_source` con una
+    base SQLite en memoria que vive mientras viva el proceso. Cada tabla se
+    registra la primera vez que se consulta, con solo las columnas que usa la
+    consulta, y se vuelve a cargar si el DBF cambió o si otra consulta
+    necesita más columnas. Las columnas filtradas o usadas en JOIN se indexan
+    al registrarlas. Los resultados se guardan en una caché LRU cuya llave
+    incluye la huella de cada DBF consultado, así que se invalidan solos
+    cuando cambia el archivo. Las consultas se atienden de a una y una
+    consulta que no consigue el motor en QUERY_LOCK_TIMEOUT segundos falla
+    con TimeoutError en lugar de esperar indefinidamente. Las transmisiones
+    (stream) toman el motor solo para leer cada lote de filas.
+    """
+
+    def __init__(self, data_source, cache_bytes=None):
+        self.data_source = data_source
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        # {tabla: {'fingerprint', 'columns', 'indexes'}}
+        self.tables = {}
+        self.lock = threading.Lock()
+        # SQLite no permite DROP TABLE con una transmisión a medio leer: las
+        # recargas esperan a que terminen las transmisiones abiertas
+        self.streams_done = threading.Condition(self.lock)
+        self.open_streams = 0
+        self.lock_timeout = float(os.getenv('QUERY_LOCK_TIMEOUT', QUERY_LOCK_TIMEOUT))
+        if cache_bytes is None:
+            cache_bytes = int(float(os.getenv('QUERY_CACHE_MB', QUERY_CACHE_MB)) * 2 ** 20)
+        self.cache = ResultCache(cache_bytes)
+
+    @contextmanager
+    def _locked(self):
+        if not self.lock.acquire(timeout=self.lock_timeout):
+            raise TimeoutError(
+                f"El motor de consultas sigue ocupado después de {self.lock_timeout:g} segundos.")
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+    def referenced_tables(self, query):
+        """Tablas de la consulta que existen como DBF en la carpeta de datos."""
+        # Un "from x" dentro de un texto o un comentario no es una tabla
+        query, _ = _strip_comments(query, blank_quoted=True)
+        tables = {}
+        for match in TABLE_PATTERN.finditer(query):
+            for name in match.group(1).split(','):
+                name = name.strip().upper()
+                if name in SQL_KEYWORDS or name in tables:
+                    continue
+                dbf_path = find_dbf_file(self.data_source, name)
+                if dbf_path is None:
+                    raise QueryError(f"La tabla {name} no existe en {self.data_source}")
+                tables[name] = dbf_path
+        if not tables:
+            raise QueryError("La consulta no indica ninguna tabla (FROM).")
+        return tables
+
+    def _queryable_fields(self, reader):
+        # Los memos binarios (imágenes, objetos OLE) no se exponen
+        return [field for field in reader.fields
+                if field.type not in 'GW' and not (field.type == 'B' and reader.version not in VFP_VERSIONS)]
+
+    def _wanted_columns(self, query, fields):
+        """Columnas de la tabla que menciona la consulta (todas con `*`)."""
+        names = [field.name for field in fields]
+        if STAR_PATTERN.search(query):
+            return set(names)
+        identifiers = {identifier.upper() for identifier in IDENTIFIER_PATTERN.findall(query)}
+        wanted = identifiers & set(names)
+        # COUNT(*) sin columnas: basta una para conservar la cantidad de filas
+        return wanted or set(names[:1])
+
+    def _filter_columns(self, query, columns):
+        """Columnas usadas en WHERE, ON o ORDER BY que conviene indexar."""
+        match = re.search(r'\b(?:WHERE|ON|ORDER\s+BY)\b(.*)', query, re.IGNORECASE | re.DOTALL)
+        if not match:
+            return set()
+        return {identifier.upper() for identifier in IDENTIFIER_PATTERN.findall(match.group(1))} & columns
+
+    def _load_table(self, table_name, dbf_path, columns, fingerprint):
+        if not self.streams_done.wait_for(lambda: not self.open_streams, self.lock_timeout):
+            raise TimeoutError(
+                f"La tabla {table_name} no se puede recargar mientras se transmite otra consulta.")
+        reader = DBFReader(dbf_path, skip_deleted=True)
+        fields = [field for field in self._queryable_fields(reader) if field.name in columns]
+        df = reader.to_dataframe([field.name for field in fields])
+        for field in fields:
+            if field.type == 'D':
+                df[field.name] = df[field.name].dt.strftime('%Y-%m-%d')
+            elif field.type == 'T':
+                df[field.name] = df[field.name].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+        self.conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        df.to_sql(table_name, self.conn, index=False, chunksize=LOAD_CHUNK_ROWS)
+        self.conn.commit()
+        self.tables[table_name] = {'fingerprint': fingerprint, 'columns': set(columns),
+                                   'indexes': set()}
+        print(f"Tabla {table_name} registrada: {len(df)} filas, {len(fields)} columnas")
+
+    def register(self, table_name, dbf_path, query, fingerprint):
+        """Carga o actualiza la tabla en SQLite según lo que necesita la consulta."""
+        reader = DBFReader(dbf_path)
+        fields = self._queryable_fields(reader)
+        wanted = self._wanted_columns(query, fields)
+
+        registered = self.tables.get(table_name)
+        if (registered is None or registered['fingerprint'] != fingerprint
+                or not wanted <= registered['columns']):
+            if registered is not None and registered['fingerprint'] == fingerprint:
+                # Conservar las columnas ya cargadas para no alternar entre proyecciones
+                wanted |= registered['columns']
+            self._load_table(table_name, dbf_path, wanted, fingerprint)
+            registered = self.tables[table_name]
+
+        for column in self._filter_columns(query, registered['columns']) - registered['indexes']:
+            self.conn.execute(
+                f'CREATE INDEX "idx_{table_name}_{column}" ON "{table_name}" ("{column}")')
+            registered['indexes'].add(column)
+
+    def _fingerprints(self, query):
+        return {table_name: (dbf_path, file_fingerprint(dbf_path))
+                for table_name, dbf_path in self.referenced_tables(query).items()}
+
+    def _register_all(self, query, tables):
+        for table_name, (dbf_path, fingerprint) in tables.items():
+            self.register(table_name, dbf_path, query, fingerprint)
+
+    def execute(self, query, limit=None, offset=0):
+        """Ejecuta el SELECT (con la página indicada) y devuelve (columnas, filas)."""
+        sql, params = paginate_query(query, limit, offset)
+        with self._locked():
+            tables = self._fingerprints(query)
+            key = (normalize_query(sql), params,
+                   tuple(sorted((name, fingerprint) for name, (_, fingerprint) in tables.items())))
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+
+            # Las columnas a registrar salen de la consulta original, no de la paginada
+            self._register_all(query, tables)
+
+            self.conn.set_authorizer(_read_only_authorizer)
+            try:
+                cursor = self.conn.execute(sql, params)
+                columns = [description[0] for description in cursor.description or []]
+                rows = cursor.fetchall()
+            finally:
+                self.conn.set_authorizer(None)
+            result = (columns, rows)
+            self.cache.put(key, result)
+            return result
+
+    def query(self, query, limit=None, offset=0):
+        """Resultado del SELECT como lista de diccionarios {columna: valor}."""
+        columns, rows = self.execute(query, limit, offset)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def stream(self, query, limit=None, offset=0, batch_size=STREAM_BATCH_ROWS):
+        """
+        Ejecuta el SELECT y devuelve (columnas, filas), donde las filas se leen
+        de SQLite por lotes a medida que se consumen, sin armar el resultado
+        completo ni pasar por la caché. Los errores de la consulta se lanzan
+        aquí, antes de leer la primera fila. El motor se toma solo para leer
+        cada lote, así que un cliente lento no detiene las demás consultas.
+        """
+        results = self._stream(query, limit, offset, batch_size)
+        # El generador ya iniciado cierra el cursor aunque las filas no se lean
+        columns = next(results)
+        return columns, results
+
+    def _stream(self, query, limit, offset, batch_size):
+        """Genera primero las columnas y luego cada fila del resultado."""
+        sql, params = paginate_query(query, limit, offset)
+        with self._locked():
+            self._register_all(query, self._fingerprints(query))
+            self.conn.set_authorizer(_read_only_authorizer)
+            try:
+                cursor = self.conn.execute(sql, params)
+            finally:
+                self.conn.set_authorizer(None)
+            self.open_streams += 1
+        try:
+            yield [description[0] for description in cursor.description or []]
+            while True:
+                with self._locked():
+                    batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            with self.lock:
+                cursor.close()
+                self.open_streams -= 1
+                self.streams_done.notify_all()
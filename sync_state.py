@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+
+
+# Carpeta (dentro de output_folder) con el estado de sincronización por tabla
+SYNC_STATE_FOLDER = '.sync'
+
+# Registros del final de la tabla que se usan para detectar reescrituras
+TAIL_RECORDS = 64
+
+
+def get_sync_state_path(output_folder, table_name):
+    return os.path.join(output_folder, SYNC_STATE_FOLDER, f"{table_name}.json")
+
+
+def load_sync_state(output_folder, table_name):
+    """Devuelve el estado guardado de la tabla, o None si no existe o es ilegible."""
+    state_path = get_sync_state_path(output_folder, table_name)
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_sync_state(output_folder, table_name, state):
+    state_path = get_sync_state_path(output_folder, table_name)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    # Escribir en un temporal y reemplazar para no dejar un estado a medias
+    temp_path = state_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, state_path)
+
+
+def clear_sync_state(output_folder, table_name):
+    try:
+        os.remove(get_sync_state_path(output_folder, table_name))
+    except FileNotFoundError:
+        pass
+
+
+def _layout_signature(reader):
+    layout = ';'.join(f"{field.name}:{field.type}:{field.length}:{field.decimals}"
+                      for field in reader.fields)
+    return hashlib.sha1(f"{reader.header_length}:{reader.record_length}:{layout}".encode()).hexdigest()
+
+
+def _tail_checksum(reader, record_count):
+    start = max(0, record_count - TAIL_RECORDS)
+    return hashlib.sha1(reader.read_raw_records(start, record_count)).hexdigest()
+
+
+def build_sync_state(reader, pending_records=()):
+    """
+    Estado de la tabla tal como está ahora en el DBF. `pending_records` son
+    las posiciones de los registros que el filtro de fechas descartó por tener
+    fecha futura y que se deben volver a revisar en la próxima corrida.
+    """
+    return {
+        'record_count': reader.record_count,
+        'last_update': reader.last_update.isoformat() if reader.last_update else None,
+        'layout': _layout_signature(reader),
+        'tail_checksum': _tail_checksum(reader, reader.record_count),
+        'pending_records': sorted(pending_records),
+    }
+
+
+def get_append_start(reader, previous_state):
+    """
+    Posición del primer registro agregado desde la última sincronización, o
+    None si hace falta una recarga completa: no hay estado previo, cambió la
+    estructura, hay menos registros que antes (PACK) o los últimos registros
+    ya sincronizados fueron modificados.
+    """
+    if not previous_state:
+        return None
+    previous_count = previous_state.get('record_count', -1)
+    if previous_state.get('layout') != _layout_signature(reader):
+        return None
+    if reader.record_count < previous_count:
+        return None
+    if _tail_checksum(reader, previous_count) != previous_state.get('tail_checksum'):
+        return None
+    return previous_count
@@ -0,0 +1,197 @@
+import csv
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import dbf_reader
+from benchmarks.generate_dbf import generate_table
+from convert_dbf_csv import convert_dbf_to_csv, read_dbf_table
+from dbf_reader import DBFReader
+from fields import PREDEFINED_FIELDS
+from process_csv import transform_dataframe
+
+RECORD_COUNT = 3000
+
+TABLES = ('SC0004', 'SC0011', 'SC0012', 'SC0017', 'SC0033')
+
+
+def setUpModule():
+    global data_dir
+    data_dir = tempfile.TemporaryDirectory()
+    for seed, table in enumerate(TABLES, start=1):
+        generate_table(table, dbf_path(table), RECORD_COUNT, seed=seed)
+
+
+def tearDownModule():
+    data_dir.cleanup()
+
+
+def dbf_path(table):
+    return os.path.join(data_dir.name, f'{table}.DBF')
+
+
+def plain(value):
+    """Lleva un valor de DataFrame o de iter_records a un escalar comparable."""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def frame_rows(df):
+    return [[plain(value) for value in row] for row in df.itertuples(index=False)]
+
+
+def dbview_csv(path):
+    """Exporta la tabla como lo hacía dbview: todo texto, fechas dd/mm/yyyy y lógicos T/F."""
+    reader = DBFReader(path)
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL)
+    writer.writerow([field.name for field in reader.fields])
+    for record in reader.iter_records():
+        row = []
+        for field, value in zip(reader.fields, record):
+            if value is None:
+                row.append('')
+            elif field.type == 'D':
+                row.append(value.strftime('%d/%m/%Y'))
+            elif field.type == 'L':
+                row.append('T' if value else 'F')
+            elif field.type == 'N' and field.decimals:
+                row.append(f'{value:.{field.decimals}f}')
+            else:
+                row.append(str(value))
+        writer.writerow(row)
+    out.seek(0)
+    return pd.read_csv(out, encoding='latin-1', low_memory=False, quotechar='"', quoting=1)
+
+
+def baseline_transform(df, table_name):
+    """Reglas originales de process_csv (cadena de if sobre el CSV de dbview)."""
+    fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    df.columns = df.columns.str.lower()
+    allowed_fields = [field.lower() for field in fields]
+    df = df[[field for field in allowed_fields if field in df.columns]]
+
+    if 'fec_fac' in df.columns:
+        df['fec_fac'] = pd.to_datetime(df['fec_fac'], format='%d/%m/%Y', errors='coerce')
+    for column in ('fec_doc', 'fec_ser'):
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], format='%d/%m/%Y', errors='coerce')
+            df = df[(df[column] >= '2023-01-01') & (df[column] <= pd.Timestamp.now())]
+
+    if 'num_doc' in df.columns:
+        df['num_doc'] = pd.to_numeric(df['num_doc'], errors='coerce')
+        df = df.dropna(subset=['num_doc'])
+        df['num_doc'] = df['num_doc'].round().astype(int).astype(str).str.zfill(10)
+    for column in ('cod_ser', 'per_dev', 'cod_pac', 'nh_pac'):
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+            df = df.dropna(subset=[column])
+            df[column] = df[column].round().astype(int)
+    if 'cod_cia' in df.columns:
+        df['cod_cia'] = pd.to_numeric(df['cod_cia'], errors='coerce')
+        df = df.dropna(subset=['cod_cia'])
+        df['cod_cia'] = df['cod_cia'].astype(int).astype(str).str.zfill(2)
+    for field, field_type in fields.items():
+        if field_type == 'BOOLEAN' and field.lower() in df.columns:
+            column = field.lower()
+            df[column] = df[column].map({'F': 0, 'T': 1, 'f': 0, 't': 1}).fillna(0).astype(int)
+    if 'id_pac' in df.columns:
+        df['id_pac'] = pd.to_numeric(df['id_pac'], errors='coerce')
+        df = df.dropna(subset=['id_pac'])
+        df['id_pac'] = df['id_pac'].astype(int)
+
+    # Cambio intencional del plan de transformación: se convierten todas las DATE
+    for field, field_type in fields.items():
+        column = field.lower()
+        if field_type == 'DATE' and column in df.columns and df[column].dtype == object:
+            df[column] = pd.to_datetime(df[column], format='%d/%m/%Y', errors='coerce')
+    return df
+
+
+def nullable_integers(df, table_name):
+    """El decodificador nativo entrega las INT con vacíos como enteros nulables, no float."""
+    for field, field_type in PREDEFINED_FIELDS[table_name]['fields'].items():
+        column = field.lower()
+        if field_type == 'INT' and column in df.columns and df[column].dtype == float:
+            df[column] = df[column].astype('Int64')
+    return df
+
+
+class DecodeTest(unittest.TestCase):
+
+    def test_to_dataframe_matches_iter_records(self):
+        for table in TABLES:
+            with self.subTest(table=table):
+                reader = DBFReader(dbf_path(table))
+                self.assertEqual(frame_rows(reader.to_dataframe()),
+                                 [[plain(value) for value in record]
+                                  for record in reader.iter_records()])
+
+    def test_to_dataframe_matches_iter_records_with_filters(self):
+        reader = DBFReader(dbf_path('SC0033'))
+        columns = ['NUM_DOC', 'FEC_DOC', 'MOT_DEV', 'OBS_DEV']
+        date_filters = {'FEC_DOC': ('2023-01-01', '2024-06-30')}
+        df = reader.to_dataframe(columns, date_filters)
+        self.assertEqual(list(df.columns), columns)
+        self.assertEqual(frame_rows(df), [[plain(value) for value in record]
+                                          for record in reader.iter_records(columns, date_filters)])
+
+    def test_positions_match_full_decode(self):
+        reader = DBFReader(dbf_path('SC0011'))
+        positions = list(range(0, RECORD_COUNT, 7))
+        selected = pd.concat([reader.to_dataframe(start=position, stop=position + 1)
+                              for position in positions], ignore_index=True)
+        pd.testing.assert_frame_equal(reader.to_dataframe(positions=positions), selected)
+
+    def test_parallel_matches_serial(self):
+        date_filters = {'FEC_DOC': ('2023-01-01', None)}
+        for table in ('SC0011', 'SC0033'):
+            with self.subTest(table=table):
+                reader = DBFReader(dbf_path(table))
+                serial = reader.to_dataframe(date_filters=date_filters)
+                with mock.patch.object(dbf_reader, 'MIN_CHUNK_RECORDS', 500):
+                    parallel = reader.to_dataframe_parallel(date_filters=date_filters, workers=3)
+                pd.testing.assert_frame_equal(parallel, serial)
+                self.assertEqual(parallel.attrs['dropped'], serial.attrs['dropped'])
+                self.assertEqual(set(serial.attrs['dropped']), {'deleted', 'date:fec_doc'})
+
+
+class TransformTest(unittest.TestCase):
+
+    def test_native_decode_matches_baseline_rules(self):
+        for table in TABLES:
+            with self.subTest(table=table):
+                expected = nullable_integers(
+                    baseline_transform(dbview_csv(dbf_path(table)), table), table)
+                self.assertEqual(read_dbf_table(dbf_path(table)).to_csv(index=False),
+                                 expected.to_csv(index=False))
+
+    def test_text_transform_matches_baseline_rules(self):
+        for table in TABLES:
+            with self.subTest(table=table):
+                expected = baseline_transform(dbview_csv(dbf_path(table)), table)
+                actual = transform_dataframe(dbview_csv(dbf_path(table)), table)
+                self.assertEqual(actual.to_csv(index=False), expected.to_csv(index=False))
+
+    def test_chunked_csv_matches_one_shot(self):
+        for table in ('SC0011', 'SC0033'):
+            with self.subTest(table=table):
+                one_shot = os.path.join(data_dir.name, f'{table}.csv')
+                chunked = os.path.join(data_dir.name, f'{table}_chunked.csv')
+                convert_dbf_to_csv(dbf_path(table), one_shot)
+                convert_dbf_to_csv(dbf_path(table), chunked, chunk_size=700)
+                with open(one_shot, 'rb') as a, open(chunked, 'rb') as b:
+                    self.assertEqual(a.read(), b.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
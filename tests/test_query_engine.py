@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from query_engine import QueryEngine, QueryError, paginate_query
+
+
+class PaginateQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE t (id INTEGER, x TEXT)')
+        self.conn.execute('CREATE TABLE t2 (id INTEGER, x TEXT)')
+        self.conn.executemany('INSERT INTO t VALUES (?, ?)', [(i, f'a{i}') for i in range(10)])
+        self.conn.executemany('INSERT INTO t2 VALUES (?, ?)', [(i, f'b{i}') for i in range(10)])
+
+    def run_query(self, query, limit=None, offset=0):
+        cursor = self.conn.execute(*paginate_query(query, limit, offset))
+        return [description[0] for description in cursor.description], cursor.fetchall()
+
+    def test_trailing_comment(self):
+        columns, rows = self.run_query('SELECT x FROM t ORDER BY id -- nota', limit=2, offset=3)
+        self.assertEqual(columns, ['x'])
+        self.assertEqual(rows, [('a3',), ('a4',)])
+
+    def test_block_comment_and_semicolon(self):
+        _, rows = self.run_query('SELECT x FROM t /* LIMIT 1 */ ORDER BY id; -- fin', limit=1)
+        self.assertEqual(rows, [('a0',)])
+
+    def test_duplicate_column_names(self):
+        columns, rows = self.run_query(
+            'SELECT t.x, t2.x FROM t JOIN t2 ON t.id = t2.id ORDER BY t.id', limit=1, offset=1)
+        self.assertEqual(columns, ['x', 'x'])
+        self.assertEqual(rows, [('a1', 'b1')])
+
+    def test_query_with_own_limit(self):
+        _, rows = self.run_query('SELECT x FROM t ORDER BY id LIMIT 5 -- nota', limit=10, offset=3)
+        self.assertEqual(rows, [('a3',), ('a4',)])
+
+    def test_limit_inside_subquery(self):
+        _, rows = self.run_query(
+            'SELECT x FROM (SELECT x, id FROM t ORDER BY id LIMIT 4) ORDER BY id', offset=2)
+        self.assertEqual(rows, [('a2',), ('a3',)])
+
+    def test_without_pagination(self):
+        query = 'SELECT COUNT(*) FROM t -- total'
+        self.assertEqual(paginate_query(query), (query, ()))
+
+
+
+class ReferencedTablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for table in ('SC0011', 'SC0017'):
+            open(os.path.join(self.directory.name, f'{table}.DBF'), 'wb').close()
+        self.engine = QueryEngine(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_join(self):
+        tables = self.engine.referenced_tables('SELECT * FROM sc0011 a JOIN SC0017 b ON a.x = b.x')
+        self.assertEqual(sorted(tables), ['SC0011', 'SC0017'])
+
+    def test_ignores_literals_and_comments(self):
+        tables = self.engine.referenced_tables(
+            "SELECT * FROM SC0011 WHERE OBS LIKE '%from caja%' -- join otra\n/* from x */")
+        self.assertEqual(list(tables), ['SC0011'])
+
+    def test_unknown_table(self):
+        with self.assertRaises(QueryError):
+            self.engine.referenced_tables('SELECT * FROM CAJA')
+
+
+if __name__ == '__main__':
+    unittest.main()
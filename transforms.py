@@ -0,0 +1,133 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from fields import (BOOLEAN_VALUES, COLUMN_RULES, DATE_FORMATS, PREDEFINED_FIELDS,
+                    get_date_filters)
+
+
+# Plan de transformación de una tabla; todas las columnas en minúsculas
+TransformPlan = namedtuple('TransformPlan', [
+    'columns',       # columnas permitidas, en el orden del esquema
+    'date_formats',  # {columna: formato} de las fechas a convertir
+    'numeric',       # {columna: 'round' | 'truncate'}
+    'zfill',         # {columna: ancho}
+    'required',      # columnas cuyas filas se descartan si quedan vacías
+    'booleans',      # columnas BOOLEAN
+])
+
+
+@lru_cache(maxsize=None)
+def compile_transform_plan(table_name):
+    """Arma una sola vez el plan de transformación de la tabla según fields.py."""
+    fields = PREDEFINED_FIELDS.get(table_name, {}).get('fields', {})
+    date_formats = {}
+    numeric = {}
+    zfill = {}
+    required = []
+    booleans = []
+
+    for field, field_type in fields.items():
+        column = field.lower()
+        if field_type in DATE_FORMATS:
+            date_formats[column] = DATE_FORMATS[field_type]
+        elif field_type == 'BOOLEAN':
+            booleans.append(column)
+
+        rules = COLUMN_RULES.get(field, {})
+        if 'numeric' in rules:
+            numeric[column] = rules['numeric']
+        if 'zfill' in rules:
+            zfill[column] = rules['zfill']
+        if rules.get('required'):
+            required.append(column)
+
+    return TransformPlan([field.lower() for field in fields], date_formats, numeric, zfill,
+                         required, booleans)
+
+
+def _finish_numeric(values, mode, required):
+    if not required:
+        # Sin descartar filas los vacíos se conservan como NULL
+        values = values.round() if mode == 'round' else np.trunc(values)
+        return values.astype('Int64')
+    if mode == 'round':
+        values = values.round()
+    return values.astype(int)
+
+
+def _map_booleans(values):
+    if pd.api.types.is_bool_dtype(values):
+        return values.fillna(False).astype(int)
+    return values.map(BOOLEAN_VALUES).fillna(0).astype(int)
+
+
+def apply_transform_plan(df, table_name, start_date=None):
+    """
+    Aplica el plan de la tabla en una sola pasada: los filtros de fecha y las
+    columnas requeridas se combinan en una sola máscara y cada columna se
+    filtra una sola vez, sin copiar el DataFrame en cada paso.
+    Las filas que descarta cada filtro se registran en las métricas de la tabla.
+    """
+    plan = compile_transform_plan(table_name)
+    df.columns = df.columns.str.lower()
+    columns = {column: df[column] for column in plan.columns if column in df.columns}
+
+    for column, date_format in plan.date_formats.items():
+        values = columns.get(column)
+        if values is not None and not pd.api.types.is_datetime64_any_dtype(values):
+            columns[column] = pd.to_datetime(values, format=date_format, errors='coerce')
+
+    # Registros con fechas válidas en el rango configurado para la tabla
+    keep = np.ones(len(df), dtype=bool)
+    for field, (start, end) in get_date_filters(table_name, start_date).items():
+        values = columns.get(field.lower())
+        if values is None:
+            continue
+        in_range = values.notna()
+        if start:
+            in_range &= values >= pd.Timestamp(start)
+        if end:
+            in_range &= values <= pd.Timestamp(end)
+        kept = np.count_nonzero(keep)
+        keep &= in_range.to_numpy()
+        metrics.add_dropped(f"date:{field.lower()}", kept - np.count_nonzero(keep))
+
+    # Los números se convierten solo en las filas que pasaron las fechas
+    candidates = np.flatnonzero(keep)
+    narrowed = len(candidates) < len(keep)
+    candidate_keep = np.ones(len(candidates), dtype=bool)
+    numeric = {}
+    for column in plan.numeric:
+        if column in columns:
+            values = columns[column]
+            if narrowed:
+                values = values.iloc[candidates]
+            numeric[column] = pd.to_numeric(values, errors='coerce')
+            if column in plan.required:
+                kept = np.count_nonzero(candidate_keep)
+                candidate_keep &= numeric[column].notna().to_numpy()
+                metrics.add_dropped(f"required:{column}", kept - np.count_nonzero(candidate_keep))
+
+    rows = candidates[candidate_keep]
+    filtered = len(rows) < len(keep)
+    for column, values in columns.items():
+        if column in numeric:
+            values = numeric[column]
+            if not candidate_keep.all():
+                values = values[candidate_keep]
+            values = _finish_numeric(values, plan.numeric[column], column in plan.required)
+        elif filtered:
+            values = values.iloc[rows]
+        if column in plan.zfill:
+            values = values.astype(str).str.zfill(plan.zfill[column])
+        if column in plan.booleans:
+            values = _map_booleans(values)
+        columns[column] = values
+
+    if not columns:
+        return df.iloc[rows, :0]
+    return pd.DataFrame(columns)